@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import boto3
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+REGION = 'us-east-1'
+ACCOUNT_ID = '123456789012'
+TAG_KEY = 'Env'
+TARGET_TAG_VALUE = 'dev'  # Clusters with this tag are the ones every variant acts on
+RUNNING_COUNT = 2  # Desired count used for running services in the synthetic fleet
+DEFAULT_THROTTLED_OPERATIONS = ['UpdateService']
+
+START_VARIANTS = ['start', 'start_v1', 'start_tag', 'start_tag2', 'start_tag3']
+STOP_VARIANTS = ['stop', 'stop_v1', 'stop_tag', 'stop_tag2', 'stop_tag3']
+
+
+class FakeEcsClient:
+    """
+    In-memory stand-in for the boto3 ECS client, covering the calls the start/stop scripts make.
+
+    Parameters:
+    - clusters (int): Number of clusters in the synthetic fleet; every other one is tagged Env=dev.
+    - services (int): Services per cluster, each tagged Name=service<N>.
+    - desired_count (int): Initial desired and running count of every service.
+    - latency (float): Seconds every API call blocks for.
+    - throttle_rate (float | None): Calls per second per operation before ThrottlingException is raised.
+    - throttled_operations (list[str]): Operations the throttle applies to. Real clients retry
+      throttled read calls inside botocore, which the stand-in does not model.
+    """
+
+    def __init__(self, clusters: int, services: int, desired_count: int = 0, latency: float = 0.0, throttle_rate: float | None = None, throttled_operations: list[str] = DEFAULT_THROTTLED_OPERATIONS) -> None:
+        real_client = boto3.client('ecs', region_name=REGION)
+        self.exceptions = real_client.exceptions
+        self.meta = real_client.meta
+
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.throttled_operations = set(throttled_operations)
+        self.calls = {}
+        self.throttles = {}
+        self._call_times = {}
+        self._lock = threading.Lock()
+
+        self.clusters = {}
+        for i in range(clusters):
+            cluster_name = f"bench-cluster-{i}"
+            cluster_arn = f"arn:aws:ecs:{REGION}:{ACCOUNT_ID}:cluster/{cluster_name}"
+            self.clusters[cluster_arn] = {
+                'name': cluster_name,
+                'tags': {TAG_KEY: TARGET_TAG_VALUE if i % 2 == 0 else 'prod'},
+                'services': {
+                    f"svc-{i}-{j}": {
+                        'arn': f"arn:aws:ecs:{REGION}:{ACCOUNT_ID}:service/{cluster_name}/svc-{i}-{j}",
+                        'tags': {'Name': f"service{j}"},
+                        'desiredCount': desired_count,
+                        'runningCount': desired_count,
+                    }
+                    for j in range(services)
+                },
+            }
+
+    def target_clusters(self) -> list[dict]:
+        return [cluster for cluster in self.clusters.values() if cluster['tags'][TAG_KEY] == TARGET_TAG_VALUE]
+
+    def list_clusters(self, nextToken: str | None = None, maxResults: int = 100) -> dict:
+        self._call('ListClusters')
+        return _page(list(self.clusters), 'clusterArns', nextToken, maxResults)
+
+    def describe_clusters(self, clusters: list[str], include: list[str] | None = None) -> dict:
+        self._call('DescribeClusters')
+        found = [self._cluster(cluster) for cluster in clusters if self._cluster(cluster)]
+        return {
+            'clusters': [
+                {'clusterArn': self._cluster_arn(cluster), 'clusterName': cluster['name'], 'tags': _tag_list(cluster['tags'])}
+                for cluster in found
+            ],
+            'failures': [],
+        }
+
+    def list_services(self, cluster: str, nextToken: str | None = None, maxResults: int = 10) -> dict:
+        self._call('ListServices')
+        service_arns = [service['arn'] for service in self._cluster(cluster)['services'].values()]
+        return _page(service_arns, 'serviceArns', nextToken, maxResults)
+
+    def describe_services(self, cluster: str, services: list[str], include: list[str] | None = None) -> dict:
+        self._call('DescribeServices')
+        found = []
+        failures = []
+
+        for service in services:
+            service_name = service.split('/')[-1]
+            state = self._cluster(cluster)['services'].get(service_name)
+
+            if state is None:
+                failures.append({'arn': service, 'reason': 'MISSING'})
+                continue
+
+            found.append({
+                'serviceArn': state['arn'],
+                'serviceName': service_name,
+                'clusterArn': self._cluster_arn(self._cluster(cluster)),
+                'status': 'ACTIVE',
+                'desiredCount': state['desiredCount'],
+                'runningCount': state['runningCount'],
+                'tags': _tag_list(state['tags']),
+            })
+
+        return {'services': found, 'failures': failures}
+
+    def list_tags_for_resource(self, resourceArn: str) -> dict:
+        self._call('ListTagsForResource')
+
+        if ':cluster/' in resourceArn:
+            return {'tags': _tag_list(self._cluster(resourceArn)['tags'])}
+
+        cluster_name, service_name = resourceArn.split('/')[-2:]
+        return {'tags': _tag_list(self._cluster(cluster_name)['services'][service_name]['tags'])}
+
+    def update_service(self, cluster: str, service: str, desiredCount: int) -> dict:
+        self._call('UpdateService')
+        state = self._cluster(cluster)['services'].get(service.split('/')[-1])
+
+        if state is None:
+            raise self.exceptions.ServiceNotFoundException(
+                {'Error': {'Code': 'ServiceNotFoundException', 'Message': 'Service not found.'}}, 'UpdateService'
+            )
+
+        state['desiredCount'] = desiredCount
+        state['runningCount'] = desiredCount
+        return {'service': {'serviceName': service, 'desiredCount': desiredCount}}
+
+    def get_paginator(self, operation_name: str):
+        return _FakePaginator(getattr(self, operation_name))
+
+    def _cluster(self, cluster: str) -> dict | None:
+        cluster_name = cluster.split('/')[-1]
+        return next((state for state in self.clusters.values() if state['name'] == cluster_name), None)
+
+    def _cluster_arn(self, cluster: dict) -> str:
+        return f"arn:aws:ecs:{REGION}:{ACCOUNT_ID}:cluster/{cluster['name']}"
+
+    def _call(self, operation_name: str) -> None:
+        with self._lock:
+            self.calls[operation_name] = self.calls.get(operation_name, 0) + 1
+
+            if self.throttle_rate is not None and operation_name in self.throttled_operations:
+                now = time.monotonic()
+                recent = [t for t in self._call_times.get(operation_name, []) if now - t < 1]
+
+                if len(recent) >= self.throttle_rate:
+                    self.throttles[operation_name] = self.throttles.get(operation_name, 0) + 1
+                    raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, operation_name)
+
+                recent.append(now)
+                self._call_times[operation_name] = recent
+
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class _FakePaginator:
+    def __init__(self, method) -> None:
+        self.method = method
+
+    def paginate(self, **kwargs):
+        next_token = None
+
+        while True:
+            page = self.method(**kwargs, nextToken=next_token) if next_token else self.method(**kwargs)
+            yield page
+
+            next_token = page.get('nextToken')
+            if not next_token:
+                break
+
+
+def _page(items: list, key: str, next_token: str | None, max_results: int) -> dict:
+    start = int(next_token or 0)
+    page = {key: items[start:start + max_results]}
+
+    if start + max_results < len(items):
+        page['nextToken'] = str(start + max_results)
+
+    return page
+
+def _tag_list(tags: dict) -> list[dict]:
+    return [{'key': key, 'value': value} for key, value in tags.items()]
+
+
+def load_variant(variant: str, fake_client: FakeEcsClient):
+    """
+    Import (or re-import, to reset module state) a start/stop script and point it at the fake client.
+    """
+    module = importlib.reload(sys.modules[variant]) if variant in sys.modules else importlib.import_module(variant)
+    module.ecs_client = fake_client
+
+    if hasattr(module, 'update_client'):
+        module.update_client = fake_client
+
+    if hasattr(module, 'cluster_tag_index'):
+        from inventory import ClusterTagIndex
+        module.cluster_tag_index = ClusterTagIndex(fake_client)
+
+    if hasattr(module, 'service_discovery'):
+        from discovery import EcsDiscovery
+        module.service_discovery = EcsDiscovery(fake_client)
+
+    return module
+
+def run_variant(module, variant: str, fake_client: FakeEcsClient) -> None:
+    target_clusters = fake_client.target_clusters()
+    service_counts = {f"service{j}": RUNNING_COUNT for j in range(len(target_clusters[0]['services']))} if target_clusters else {}
+
+    if variant in ('start_tag', 'start_tag2', 'start_tag3'):
+        module.start_services_by_tags([{'tag_key': TAG_KEY, 'tag_value': TARGET_TAG_VALUE, 'services': service_counts}])
+    elif variant in ('stop_tag', 'stop_tag2', 'stop_tag3'):
+        module.stop_services_by_tags([{'key': TAG_KEY, 'value': TARGET_TAG_VALUE}])
+    elif variant == 'start':
+        for cluster in target_clusters:
+            desired_counts = {service_name: RUNNING_COUNT for service_name in cluster['services']}
+            for service_name in cluster['services']:
+                module.start_ecs_service(cluster['name'], service_name, desired_counts)
+    elif variant == 'stop':
+        module.stop_all_services({cluster['name']: list(cluster['services']) for cluster in target_clusters})
+    elif variant in ('start_v1', 'stop_v1'):
+        for cluster in target_clusters:
+            module.update_services(cluster['name'], {service_name: RUNNING_COUNT for service_name in cluster['services']})
+
+@contextmanager
+def quiet_logging():
+    root_logger = logging.getLogger()
+    previous_level = root_logger.level
+    root_logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        root_logger.setLevel(previous_level)
+
+def benchmark_variant(variant: str, clusters: int, services: int, latency: float, throttle_rate: float | None, throttled_operations: list[str] = DEFAULT_THROTTLED_OPERATIONS) -> dict:
+    initial_count = 0 if variant.startswith('start') else RUNNING_COUNT
+    fake_client = FakeEcsClient(clusters, services, initial_count, latency, throttle_rate, throttled_operations)
+    module = load_variant(variant, fake_client)
+
+    tracemalloc.start()
+    started_at = time.perf_counter()
+
+    with quiet_logging():
+        run_variant(module, variant, fake_client)
+
+    wall_time = time.perf_counter() - started_at
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    expected_count = RUNNING_COUNT if variant.startswith('start') else 0
+    target_services = [service for cluster in fake_client.target_clusters() for service in cluster['services'].values()]
+
+    return {
+        'variant': variant,
+        'wall_time': wall_time,
+        'api_calls': dict(sorted(fake_client.calls.items())),
+        'total_calls': sum(fake_client.calls.values()),
+        'throttles': sum(fake_client.throttles.values()),
+        'peak_memory_kib': peak_memory / 1024,
+        'services_converged': sum(1 for service in target_services if service['desiredCount'] == expected_count),
+        'services_targeted': len(target_services),
+    }
+
+def print_report(results: list[dict]) -> None:
+    header = f"{'variant':<12} {'wall (s)':>9} {'calls':>7} {'throttled':>9} {'peak KiB':>9} {'converged':>11}"
+    print(header)
+    print('-' * len(header))
+
+    for result in results:
+        converged = f"{result['services_converged']}/{result['services_targeted']}"
+        print(
+            f"{result['variant']:<12} {result['wall_time']:>9.2f} {result['total_calls']:>7} "
+            f"{result['throttles']:>9} {result['peak_memory_kib']:>9.0f} {converged:>11}"
+        )
+
+    print()
+    for result in results:
+        print(f"{result['variant']}: {result['api_calls']}")
+
+def parse_command_line_args():
+    parser = argparse.ArgumentParser(description='Benchmark the start/stop scripts against an in-memory ECS stand-in.')
+    parser.add_argument('--variants', nargs='+', choices=START_VARIANTS + STOP_VARIANTS, default=START_VARIANTS + STOP_VARIANTS, help='Scripts to benchmark')
+    parser.add_argument('--clusters', type=int, default=4, help='Clusters in the synthetic fleet (half are targeted)')
+    parser.add_argument('--services', type=int, default=20, help='Services per cluster')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds added to every API call')
+    parser.add_argument('--throttle-rate', type=float, default=None, help='Calls per second per operation before ThrottlingException')
+    parser.add_argument('--throttle-operations', nargs='+', default=DEFAULT_THROTTLED_OPERATIONS, help='API operations the throttle applies to')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_command_line_args()
+
+    results = []
+    for variant in args.variants:
+        print(f"Running {variant}...", file=sys.stderr)
+        results.append(benchmark_variant(variant, args.clusters, args.services, args.latency, args.throttle_rate, args.throttle_operations))
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
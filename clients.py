@@ -0,0 +1,65 @@
+import os
+import boto3
+import threading
+from botocore.config import Config
+
+MAX_POOL_CONNECTIONS = int(os.getenv('MAX_POOL_CONNECTIONS', 50))  # Room for 4 clusters x 10 update workers plus discovery
+MAX_RETRY_ATTEMPTS = int(os.getenv('AWS_MAX_ATTEMPTS', 3))  # Attempts per call, including the first
+CONNECT_TIMEOUT = float(os.getenv('AWS_CONNECT_TIMEOUT', 5))  # Seconds to establish a connection
+READ_TIMEOUT = float(os.getenv('AWS_READ_TIMEOUT', 30))  # Seconds to wait for a response
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def client_config(max_pool_connections: int = MAX_POOL_CONNECTIONS, max_attempts: int = MAX_RETRY_ATTEMPTS) -> Config:
+    """
+    botocore config shared by every client: a connection pool large enough for the worker
+    threads, standard retries, TCP keep-alive and explicit timeouts.
+
+    Standard rather than adaptive mode: adaptive adds a client-side rate limiter whose sleeps
+    are invisible to the repo's own limiters, metrics and profiles.
+    """
+    return Config(
+        max_pool_connections=max_pool_connections,
+        retries={'mode': 'standard', 'total_max_attempts': max_attempts},
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+    )
+
+def get_session() -> boto3.Session:
+    global _session
+
+    with _lock:
+        if _session is None:
+            _session = boto3.Session()
+        return _session
+
+def get_client(service_name: str, region_name: str | None = None, session: boto3.Session | None = None, caller_throttled: bool = False):
+    """
+    Return the shared client for a service, creating it on first use.
+
+    Clients are thread-safe once created, but creating them from a shared session is not, so
+    creation is serialized and every worker thread and cluster reuses the same client and its
+    connection pool.
+
+    Parameters:
+    - service_name (str): boto3 service name, for example "ecs".
+    - region_name (str | None): Region override; defaults to the session's region.
+    - session (boto3.Session | None): Session to build the client from; defaults to the shared one.
+    - caller_throttled (bool): Return a separate client with botocore retries turned off, for
+      calls the caller sends through an AdaptiveRateLimiter (the executor's update_service,
+      pipeline_lambda's call_with_backoff). Every throttle then reaches the limiter, and those
+      calls do not drain the retry quota of the shared client used for discovery and polling.
+    """
+    session = session or get_session()
+    key = (service_name, region_name, id(session), caller_throttled)
+
+    with _lock:
+        if key not in _clients:
+            config = client_config(max_attempts=1) if caller_throttled else client_config()
+            # Keep the session alive with its client, so its id is never reused for another session.
+            _clients[key] = (session, session.client(service_name, region_name=region_name, config=config))
+        return _clients[key][1]
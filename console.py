@@ -0,0 +1,14 @@
+import os
+
+# Log colours for the modules ecs_lambda.py shares with the scripts (executor). In Lambda,
+# where AWS_LAMBDA_FUNCTION_NAME is set, they are empty strings: colorama does not need to be
+# packaged and CloudWatch gets plain text.
+
+if os.getenv('AWS_LAMBDA_FUNCTION_NAME'):
+    class Fore:
+        RED = GREEN = YELLOW = CYAN = ''
+
+    class Style:
+        RESET_ALL = ''
+else:
+    from colorama import Fore, Style
@@ -0,0 +1,155 @@
+import os
+import logging
+import threading
+
+from clients import get_client
+from inventory import ClusterTagIndex, describe_services_inventory, list_service_arns, tags_to_dict
+from inventory_cache import DEFAULT_CACHE_PATH, DEFAULT_CACHE_TTL, CachedDiscovery, open_inventory_cache
+
+logger = logging.getLogger(__name__)
+
+RESOURCES_PER_PAGE = 100  # Maximum resources per GetResources page
+
+
+class EcsDiscovery:
+    """
+    Discover clusters and services by walking the ECS API.
+
+    Cluster tags come from batched describe_clusters calls; services are listed and then
+    described 10 at a time, so desired and running counts are known for every service.
+    """
+
+    def __init__(self, ecs_client) -> None:
+        self.ecs_client = ecs_client
+        self.cluster_tag_index = ClusterTagIndex(ecs_client)
+
+    def list_cluster_arns(self) -> list[str]:
+        clusters_paginator = self.ecs_client.get_paginator('list_clusters')
+        cluster_arns = [
+            cluster_arn
+            for clusters_page in clusters_paginator.paginate()
+            for cluster_arn in clusters_page.get('clusterArns', [])
+        ]
+        self.cluster_tag_index.prefetch(cluster_arns)
+
+        return cluster_arns
+
+    def get_cluster_tags(self, cluster_arn: str) -> dict:
+        return self.cluster_tag_index.get(cluster_arn)
+
+    def describe_services(self, cluster_arn: str) -> dict[str, dict]:
+        service_arns = list_service_arns(self.ecs_client, cluster_arn)
+        return describe_services_inventory(self.ecs_client, cluster_arn, service_arns)
+
+    def describe_service_arns(self, cluster_arn: str, service_arns: list[str]) -> dict[str, dict]:
+        return describe_services_inventory(self.ecs_client, cluster_arn, service_arns)
+
+    def record_results(self, results: list[dict]) -> None:
+        pass
+
+
+class TaggingApiDiscovery:
+    """
+    Discover clusters and services with a few paginated Resource Groups Tagging API sweeps.
+
+    One get_resources sweep returns every tagged cluster with its tags and another returns
+    every tagged service, which is then grouped by cluster. Untagged services are never
+    returned, and desired/running counts and status are not known (they are set to None).
+    """
+
+    def __init__(self, tagging_client) -> None:
+        self.tagging_client = tagging_client
+        self._cluster_tags = None
+        self._services = None
+        self._lock = threading.Lock()
+
+    def list_cluster_arns(self) -> list[str]:
+        return list(self._load_cluster_tags())
+
+    def get_cluster_tags(self, cluster_arn: str) -> dict:
+        return self._load_cluster_tags().get(cluster_arn, {})
+
+    def describe_services(self, cluster_arn: str) -> dict[str, dict]:
+        return self._load_services().get(cluster_arn, {})
+
+    def describe_service_arns(self, cluster_arn: str, service_arns: list[str]) -> dict[str, dict]:
+        services = self.describe_services(cluster_arn)
+        return {service_arn: services[service_arn] for service_arn in service_arns if service_arn in services}
+
+    def record_results(self, results: list[dict]) -> None:
+        pass
+
+    def _load_cluster_tags(self) -> dict[str, dict]:
+        with self._lock:
+            if self._cluster_tags is None:
+                self._cluster_tags = {
+                    resource['ResourceARN']: tags_to_dict(_lowercase_tags(resource.get('Tags')))
+                    for resource in self._get_resources('ecs:cluster')
+                }
+            return self._cluster_tags
+
+    def _load_services(self) -> dict[str, dict[str, dict]]:
+        with self._lock:
+            if self._services is None:
+                self._services = {}
+
+                for resource in self._get_resources('ecs:service'):
+                    service_arn = resource['ResourceARN']
+                    cluster_arn = cluster_arn_for_service(service_arn)
+
+                    if cluster_arn is None:
+                        logger.warning(f"Service {service_arn} uses the old ARN format without a cluster name. Skipping service.")
+                        continue
+
+                    self._services.setdefault(cluster_arn, {})[service_arn] = {
+                        'cluster': cluster_arn,
+                        'name': service_arn.split('/')[-1],
+                        'tags': tags_to_dict(_lowercase_tags(resource.get('Tags'))),
+                        'desired_count': None,
+                        'running_count': None,
+                        'status': None,
+                    }
+            return self._services
+
+    def _get_resources(self, resource_type: str) -> list[dict]:
+        resources_paginator = self.tagging_client.get_paginator('get_resources')
+        resources_iterator = resources_paginator.paginate(
+            ResourceTypeFilters=[resource_type],
+            ResourcesPerPage=RESOURCES_PER_PAGE,
+        )
+
+        return [resource for resources_page in resources_iterator for resource in resources_page.get('ResourceTagMappingList', [])]
+
+
+def cluster_arn_for_service(service_arn: str) -> str | None:
+    """
+    Derive the cluster ARN from a long-format service ARN
+    (arn:aws:ecs:region:account:service/cluster-name/service-name).
+    """
+    prefix, _, resource = service_arn.partition(':service/')
+    parts = resource.split('/')
+
+    if len(parts) != 2:
+        return None
+
+    return f"{prefix}:cluster/{parts[0]}"
+
+def _lowercase_tags(tags: list[dict] | None) -> list[dict]:
+    return [{'key': tag['Key'], 'value': tag['Value']} for tag in tags or []]
+
+def create_discovery(backend: str, ecs_client, cache: bool = False, cache_ttl: float = DEFAULT_CACHE_TTL, refresh: bool = False, live_counts: bool = False):
+    """
+    Build the discovery backend selected on the command line ("ecs" or "tagging"),
+    optionally wrapped in the on-disk inventory cache. With `live_counts`, the cache still
+    serves the service lists and tags but desired counts are always read from ECS.
+    """
+    if backend == 'tagging':
+        service_discovery = TaggingApiDiscovery(get_client('resourcegroupstaggingapi'))
+    else:
+        service_discovery = EcsDiscovery(ecs_client)
+
+    if cache:
+        inventory_cache = open_inventory_cache(ecs_client, os.getenv('INVENTORY_CACHE_PATH', DEFAULT_CACHE_PATH))
+        service_discovery = CachedDiscovery(service_discovery, inventory_cache, cache_ttl, refresh, live_counts)
+
+    return service_discovery
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import logging
+
+# boto3 and the shared modules are imported on first use, so the init phase of a
+# cold start only pays for the standard library.
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+RATE_LIMIT = float(os.getenv('RATE_LIMIT', 20))  # Starting calls per second for ECS UpdateService API
+MAX_RATE_LIMIT = float(os.getenv('MAX_RATE_LIMIT', 50))  # Ceiling the adaptive rate ramps up to
+TIME_BUDGET_MARGIN = float(os.getenv('TIME_BUDGET_MARGIN', 30))  # Seconds kept free before the Lambda timeout for retries and the response
+
+# Kept for the lifetime of the execution environment and reused by warm invocations.
+_ecs_client = None
+_update_client = None
+_rate_limiter = None
+_inventory_cache = None
+
+
+def lambda_handler(event, context):
+    """
+    Start or stop ECS services in tagged clusters from a scheduled Lambda invocation.
+
+    Configuration comes from the event rather than from .env:
+    - action (str): "start" or "stop".
+    - clusters (list[dict]): CLUSTERS entries, for "start".
+    - tags (list[dict]): STOP_TAGS entries, for "stop".
+    - converge, refresh, cache_ttl, max_clusters: Same meaning as the start_tag3.py/stop_tag3.py flags.
+    - cursor (dict): The `cursor` returned by a previous invocation that ran out of time.
+
+    The ECS clients, the adaptive rate limiter and an in-memory inventory cache are reused
+    across warm invocations, so those skip client setup and, within cache_ttl, discovery.
+
+    No update is started later than TIME_BUDGET_MARGIN seconds before the Lambda timeout.
+    Updates that did not fit are returned as `cursor`. Invoke the handler again with the same
+    event plus that cursor, for example from a Step Functions loop, until `cursor` is None.
+    """
+    started_at = time.perf_counter()
+    deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - TIME_BUDGET_MARGIN
+    warm_start = _ecs_client is not None
+
+    try:
+        action = event.get('action')
+
+        if action not in ('start', 'stop'):
+            return {
+                'statusCode': 400,
+                'body': f"Unknown action {action!r}. Expected 'start' or 'stop'."
+            }
+
+        from executor import MAX_CLUSTER_WORKERS, MAX_WORKERS, converge_updates, retry_failed_updates, update_services
+        from inventory_cache import DEFAULT_CACHE_TTL
+
+        ecs_client = get_ecs_client()
+        update_client = get_update_client()
+        rate_limiter = get_rate_limiter()
+        service_discovery = get_service_discovery(ecs_client, context, event.get('cache_ttl', DEFAULT_CACHE_TTL), event.get('refresh', False), event.get('converge', False))
+        max_clusters = event.get('max_clusters', MAX_CLUSTER_WORKERS)
+        cursor = event.get('cursor')
+
+        if cursor is not None:
+            # A continuation already knows its updates, so skip discovery.
+            updates = cursor['updates']
+        elif action == 'start':
+            updates = get_start_updates(service_discovery, event.get('clusters', []), max_clusters)
+        else:
+            updates = get_stop_updates(service_discovery, event.get('tags', []), max_clusters)
+
+        calls_saved = 0
+        if event.get('converge', False):
+            updates, calls_saved = converge_updates(updates)
+
+        results = update_services(update_client, updates, rate_limiter, MAX_WORKERS, deadline=deadline)
+        service_discovery.record_results(results)
+
+        results = retry_failed_updates(update_client, results, rate_limiter, MAX_WORKERS, deadline=deadline)
+        service_discovery.record_results([result for result in results if 'retry_attempts' in result])
+
+        deferred_updates = [
+            {key: value for key, value in result.items() if key != 'status'}
+            for result in results if result['status'] == 'deferred'
+        ]
+        next_cursor = None
+        if deferred_updates:
+            next_cursor = {
+                'updates': deferred_updates,
+                'position': (cursor or {}).get('position', 0) + len(results) - len(deferred_updates),
+                'invocation': (cursor or {}).get('invocation', 0) + 1,
+            }
+
+        summary = {
+            'action': action,
+            'warm_start': warm_start,
+            'duration_seconds': round(time.perf_counter() - started_at, 3),
+            'updated': sum(1 for result in results if result['status'] == 'updated'),
+            'not_found': sum(1 for result in results if result['status'] == 'not_found'),
+            'deferred': len(deferred_updates),
+            'calls_saved': calls_saved,
+            'failed': [
+                {'cluster': result['cluster'], 'service': result['service'], 'error': result.get('error')}
+                for result in results if result['status'] == 'failed'
+            ],
+        }
+        logger.info(f"ECS {action} finished: {summary}")
+
+        if next_cursor is not None:
+            logger.info(f"Ran out of time with {len(deferred_updates)} updates left; returning a cursor to continue from.")
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps(summary),
+            'cursor': next_cursor
+        }
+
+    except Exception as e:
+        logger.exception(f"Error running ECS {event.get('action')}: {e}")
+        return {
+            'statusCode': 500,
+            'body': f"Error running ECS {event.get('action')}: {e}"
+        }
+
+def get_ecs_client():
+    global _ecs_client
+
+    if _ecs_client is None:
+        from clients import get_client
+        _ecs_client = get_client('ecs')
+
+    return _ecs_client
+
+def get_update_client():
+    global _update_client
+
+    # botocore does not retry this client's calls, so every throttle reaches the rate limiter.
+    if _update_client is None:
+        from clients import get_client
+        _update_client = get_client('ecs', caller_throttled=True)
+
+    return _update_client
+
+def get_rate_limiter():
+    global _rate_limiter
+
+    # Reusing the limiter lets a warm container keep the rate it learned from earlier throttling.
+    if _rate_limiter is None:
+        from rate_limiter import AdaptiveRateLimiter
+        _rate_limiter = AdaptiveRateLimiter(RATE_LIMIT, max_rate=MAX_RATE_LIMIT)
+
+    return _rate_limiter
+
+def get_service_discovery(ecs_client, context, cache_ttl: float, refresh: bool = False, live_counts: bool = False):
+    global _inventory_cache
+
+    from discovery import EcsDiscovery
+    from inventory_cache import CachedDiscovery, InventoryCache
+
+    if _inventory_cache is None:
+        # The account ID is already in the function ARN, which saves an STS call on cold start.
+        account = context.invoked_function_arn.split(':')[4]
+        _inventory_cache = InventoryCache(':memory:', account, ecs_client.meta.region_name)
+
+    # A fresh backend per invocation, so cluster tags are re-read once the cache TTL expires.
+    return CachedDiscovery(EcsDiscovery(ecs_client), _inventory_cache, cache_ttl, refresh, live_counts)
+
+def get_start_updates(service_discovery, clusters: list[dict], max_clusters: int) -> list[dict]:
+    from concurrent.futures import ThreadPoolExecutor
+    from selection import index_start_clusters, resolve_start_updates
+
+    cluster_indexes = index_start_clusters(service_discovery, service_discovery.list_cluster_arns(), clusters)
+
+    def get_cluster_updates(cluster_arn: str) -> list[dict]:
+        return resolve_start_updates(cluster_arn, service_discovery.describe_services(cluster_arn), cluster_indexes[cluster_arn])
+
+    with ThreadPoolExecutor(max_workers=max_clusters) as pool:
+        return [update for updates in pool.map(get_cluster_updates, cluster_indexes) for update in updates]
+
+def get_stop_updates(service_discovery, tags: list[dict], max_clusters: int) -> list[dict]:
+    from concurrent.futures import ThreadPoolExecutor
+    from selection import filter_stop_clusters, resolve_stop_updates, select_stop_services
+
+    filtered_clusters = filter_stop_clusters(service_discovery, service_discovery.list_cluster_arns(), tags)
+
+    def get_cluster_updates(cluster_arn: str) -> list[dict]:
+        service_inventory = select_stop_services(service_discovery.describe_services(cluster_arn), service_discovery.get_cluster_tags(cluster_arn), tags)
+        return resolve_stop_updates(cluster_arn, service_inventory)
+
+    with ThreadPoolExecutor(max_workers=max_clusters) as pool:
+        return [update for updates in pool.map(get_cluster_updates, filtered_clusters) for update in updates]
@@ -0,0 +1,342 @@
+import logging
+import queue
+import random
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import MAX_RETRY_ATTEMPTS
+from console import Fore, Style
+from inventory import describe_services_inventory
+from journal import RunJournal
+from rate_limiter import TokenBucket, is_throttling_error, is_transient_error
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 10  # Update threads per cluster; clients.MAX_POOL_CONNECTIONS leaves a connection for each
+MAX_CLUSTER_WORKERS = 4  # Clusters discovered and updated at the same time
+MAX_THROTTLE_RETRIES = 8  # Attempts per service after ECS throttles an update
+MAX_TRANSIENT_RETRIES = MAX_RETRY_ATTEMPTS - 1  # Retries after a 5xx or connection error, as botocore's standard mode would make
+FAILURE_RETRY_ATTEMPTS = 3  # Retries per failed service once the run's first pass is done
+FAILURE_RETRY_BASE_DELAY = 1.0  # Seconds; doubled for every retry of the same service
+FAILURE_RETRY_MAX_DELAY = 30.0  # Ceiling on the backoff between retries of one service
+STREAM_QUEUE_SIZE = 100  # Updates buffered between a streaming producer and the workers
+
+stop_event = threading.Event()  # Set by request_stop(); no worker starts a new update once it is set
+
+
+def request_stop() -> None:
+    """
+    Ask every worker to stop, for a SIGINT handler. Updates already sent to ECS finish; the
+    rest are returned with status "cancelled", which the journal does not count as completed,
+    so --resume runs them.
+    """
+    stop_event.set()
+
+def update_services(ecs_client, updates: list[dict], limiter: TokenBucket, max_workers: int = MAX_WORKERS, journal: RunJournal | None = None, deadline: float | None = None) -> list[dict]:
+    """
+    Apply desired count updates concurrently, throttled by a shared token bucket.
+
+    Updates targeting the same service are applied in order by a single worker so the
+    final desired count matches what a serial loop would have produced.
+
+    Parameters:
+    - ecs_client: ECS client for the update_service calls, from get_client('ecs', caller_throttled=True)
+      so that botocore leaves every throttle to `limiter`.
+    - updates (list[dict]): Items with `cluster`, `service` and `desired_count` keys.
+    - limiter (TokenBucket): Rate limiter shared by all workers.
+    - max_workers (int): Number of concurrent update_service calls.
+    - journal (RunJournal | None): Records planned and completed updates, and drops updates a resumed run already completed.
+    - deadline (float | None): time.monotonic() value after which no new update is started;
+      the remaining updates are returned with status "deferred".
+
+    After request_stop(), updates not yet started are returned with status "cancelled".
+
+    Returns:
+    - list[dict]: One result per update with an added `status` key.
+    """
+    if journal is not None:
+        remaining_updates = journal.skip_completed(updates)
+        if len(remaining_updates) < len(updates):
+            logger.info(f"{Fore.CYAN}Skipped {len(updates) - len(remaining_updates)} updates completed by a previous run.{Style.RESET_ALL}")
+
+        updates = remaining_updates
+        journal.record_planned(updates)
+
+    grouped_updates = {}
+    for update in updates:
+        grouped_updates.setdefault((update['cluster'], update['service']), []).append(update)
+
+    if not grouped_updates:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(_apply_updates, ecs_client, service_updates, limiter, journal, deadline)
+            for service_updates in grouped_updates.values()
+        ]
+
+        try:
+            results = [result for future in futures for result in future.result()]
+        except BaseException:
+            # Ctrl-C or sys.exit() while waiting: leaving the with block would otherwise run every queued update first.
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    logger.info(f"Effective update_service rate: {limiter.rate:.1f} calls/sec")
+    return results
+
+def stop_targeted_services(ecs_client, update_client, cluster_name: str, service_names: list[str], limiter: TokenBucket, max_workers: int = MAX_WORKERS) -> list[dict]:
+    """
+    Stop only the named services of one cluster, for the stop.py/stop_v1.py -c/-s fast path:
+    validate them with batched describe_services calls on `ecs_client`, then update them
+    concurrently on `update_client` under the rate limiter. Names that are not active services
+    of the cluster are logged and skipped.
+
+    Returns:
+    - list[dict]: One result per stopped service, as from update_services.
+    """
+    try:
+        service_names = list(dict.fromkeys(service_names))
+        service_inventory = describe_services_inventory(ecs_client, cluster_name, service_names)
+        active_services = {service['name']: service for service in service_inventory.values() if service['status'] == 'ACTIVE'}
+
+        for service_name in service_names:
+            if service_name not in active_services:
+                logger.error(f"Service {service_name} not found in cluster {cluster_name}")
+
+        updates = [
+            {'cluster': cluster_name, 'service': service_name, 'desired_count': 0, 'current_count': service['desired_count']}
+            for service_name, service in active_services.items()
+        ]
+        return update_services(update_client, updates, limiter, max_workers)
+
+    except ecs_client.exceptions.ClientError as e:
+        error_message = e.response.get('Error', {}).get('Message')
+        logger.error(f"Error stopping services in cluster {cluster_name}. Message: {error_message}")
+        return []
+    except Exception as e:
+        logger.error(f"Unexpected error stopping services in cluster {cluster_name}: {e}")
+        return []
+
+def stream_updates(ecs_client, updates: Iterable[dict], limiter: TokenBucket, max_workers: int = MAX_WORKERS, queue_size: int = STREAM_QUEUE_SIZE) -> list[dict]:
+    """
+    Apply updates while they are still being produced, overlapping discovery with mutation.
+
+    `updates` is consumed on a producer thread and handed to the workers through a bounded
+    queue. The producer blocks when it gets more than `queue_size` updates ahead, so a generator
+    that lists services page by page never holds more than that in memory. Unlike update_services,
+    several updates for the same service are not applied in order.
+
+    Returns:
+    - list[dict]: One result per update with an added `status` key. If the producer failed, its
+      exception is raised once the updates produced so far have been applied.
+    """
+    update_queue = queue.Queue(maxsize=queue_size)
+    producer_errors = []
+
+    def produce() -> None:
+        try:
+            for update in updates:
+                if stop_event.is_set():
+                    break
+                update_queue.put(update)
+        except Exception as e:
+            producer_errors.append(e)
+        finally:
+            for _ in range(max_workers):
+                update_queue.put(None)
+
+    def consume() -> list[dict]:
+        results = []
+        while (update := update_queue.get()) is not None:
+            if stop_event.is_set():
+                results.append({**update, 'status': 'cancelled'})
+            else:
+                results.append(_apply_update(ecs_client, update, limiter))
+        return results
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(consume) for _ in range(max_workers)]
+        results = [result for future in futures for result in future.result()]
+
+    producer.join()
+
+    if producer_errors:
+        raise producer_errors[0]
+
+    logger.info(f"Effective update_service rate: {limiter.rate:.1f} calls/sec")
+    return results
+
+def converge_updates(updates: list[dict]) -> tuple[list[dict], int]:
+    """
+    Drop updates whose target already matches the service's current desired count.
+
+    Only the last update per service is kept, since it determines the final desired count.
+    Updates without a `current_count` key are always kept.
+
+    Returns:
+    - tuple[list[dict], int]: Updates still to apply and the number of update_service calls saved.
+    """
+    final_updates = {}
+    for update in updates:
+        final_updates[(update['cluster'], update['service'])] = update
+
+    pending_updates = [
+        update for update in final_updates.values()
+        if update.get('current_count') != update['desired_count']
+    ]
+
+    return pending_updates, len(updates) - len(pending_updates)
+
+def retry_failed_updates(ecs_client, results: list[dict], limiter: TokenBucket, max_workers: int = MAX_WORKERS, journal: RunJournal | None = None, deadline: float | None = None) -> list[dict]:
+    """
+    Retry the failed updates of a run concurrently, with exponential backoff and full jitter.
+
+    Each failed service is retried on its own worker, at most FAILURE_RETRY_ATTEMPTS times,
+    and every attempt still goes through the shared rate limiter.
+
+    With a `deadline` (a time.monotonic() value), no retry is started, and no backoff is
+    waited, past it. A failed update that never got a retry is returned with status
+    "deferred" instead of "failed", so the caller can carry it over to its next run.
+
+    Returns:
+    - list[dict]: The results with each failed update replaced by the outcome of its retries.
+      Retried results carry a `retry_attempts` key.
+    """
+    failed_results = [result for result in results if result['status'] == 'failed']
+
+    if not failed_results:
+        return results
+
+    logger.info(f"{Fore.YELLOW}Retrying {len(failed_results)} failed updates.{Style.RESET_ALL}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        retried_results = list(pool.map(lambda result: _retry_update(ecs_client, result, limiter, journal, deadline), failed_results))
+
+    still_failed = sum(1 for result in retried_results if result['status'] in ('failed', 'deferred'))
+    logger.info(f"{len(failed_results) - still_failed} of {len(failed_results)} failed updates succeeded on retry.")
+
+    return [result for result in results if result['status'] != 'failed'] + retried_results
+
+def _retry_update(ecs_client, failed_result: dict, limiter: TokenBucket, journal: RunJournal | None = None, deadline: float | None = None) -> dict:
+    update = {key: value for key, value in failed_result.items() if key not in ('status', 'error')}
+    result = failed_result
+
+    for attempt in range(FAILURE_RETRY_ATTEMPTS):
+        delay = random.uniform(0, min(FAILURE_RETRY_MAX_DELAY, FAILURE_RETRY_BASE_DELAY * 2 ** attempt))
+
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            if attempt == 0:
+                result = {**update, 'status': 'deferred'}
+            break
+
+        # Waiting on the stop event instead of sleeping lets Ctrl-C cut the backoff short.
+        if stop_event.wait(delay):
+            break
+
+        result = {**_apply_update(ecs_client, update, limiter, deadline), 'retry_attempts': attempt + 1}
+        if result['status'] != 'failed':
+            break
+
+    if journal is not None:
+        journal.record_completed(result)
+
+    return result
+
+def _apply_updates(ecs_client, service_updates: list[dict], limiter: TokenBucket, journal: RunJournal | None = None, deadline: float | None = None) -> list[dict]:
+    results = []
+    for update in service_updates:
+        if stop_event.is_set():
+            results.append({**update, 'status': 'cancelled'})
+            continue
+
+        if deadline is not None and time.monotonic() >= deadline:
+            results.append({**update, 'status': 'deferred'})
+            continue
+
+        result = _apply_update(ecs_client, update, limiter, deadline)
+        if journal is not None:
+            journal.record_completed(result)
+        results.append(result)
+
+    return results
+
+def _apply_update(ecs_client, update: dict, limiter: TokenBucket, deadline: float | None = None) -> dict:
+    cluster_arn = update['cluster']
+    service_name = update['service']
+    desired_count = update['desired_count']
+    throttle_retries = 0
+    transient_retries = 0
+
+    while True:
+        limiter.acquire()
+
+        # The stop may have been requested while this worker waited for a token.
+        if stop_event.is_set():
+            return {**update, 'status': 'cancelled'}
+
+        try:
+            ecs_client.update_service(
+                cluster=cluster_arn,
+                service=service_name,
+                desiredCount=desired_count,
+            )
+            limiter.on_success()
+            break
+        except ecs_client.exceptions.ServiceNotFoundException:
+            logger.warning(f"{Fore.YELLOW}Service {service_name} not found in cluster {cluster_arn}. Skipping service.{Style.RESET_ALL}")
+            return {**update, 'status': 'not_found'}
+        except ecs_client.exceptions.ClientError as e:
+            error_message = e.response.get('Error', {}).get('Message')
+
+            if is_throttling_error(e) and throttle_retries < MAX_THROTTLE_RETRIES:
+                throttle_retries += 1
+                rate = limiter.on_throttle()
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    logger.warning(f"{Fore.YELLOW}Throttled updating service {service_name} in cluster {cluster_arn} after the deadline. Deferring it.{Style.RESET_ALL}")
+                    return {**update, 'status': 'deferred'}
+
+                logger.warning(f"{Fore.YELLOW}Throttled updating service {service_name} in cluster {cluster_arn}. Retrying at {rate:.1f} calls/sec.{Style.RESET_ALL}")
+                continue
+
+            if is_transient_error(e) and transient_retries < MAX_TRANSIENT_RETRIES and _wait_for_transient_retry(transient_retries, deadline):
+                transient_retries += 1
+                logger.warning(f"{Fore.YELLOW}Transient error updating service {service_name} in cluster {cluster_arn}. Retrying. Message: {error_message}{Style.RESET_ALL}")
+                continue
+
+            logger.error(f"Error updating service {service_name} in cluster {cluster_arn}. Message: {error_message}")
+            return {**update, 'status': 'failed', 'error': error_message}
+        except Exception as e:
+            if is_transient_error(e) and transient_retries < MAX_TRANSIENT_RETRIES and _wait_for_transient_retry(transient_retries, deadline):
+                transient_retries += 1
+                logger.warning(f"{Fore.YELLOW}Transient error updating service {service_name} in cluster {cluster_arn}: {e}. Retrying.{Style.RESET_ALL}")
+                continue
+
+            # Connection errors and the like must not take down the other services' workers.
+            logger.error(f"Unexpected error updating service {service_name} in cluster {cluster_arn}: {e}")
+            return {**update, 'status': 'failed', 'error': str(e)}
+
+    if desired_count == 0:
+        logger.info(f"{Fore.RED}Service {service_name} in cluster {cluster_arn} stopped (desired count set to 0).{Style.RESET_ALL}")
+    else:
+        logger.info(f"{Fore.GREEN}Service {service_name} in cluster {cluster_arn} started (desired count set to {desired_count}).{Style.RESET_ALL}")
+
+    return {**update, 'status': 'updated', 'updated_at': time.time()}
+
+def _wait_for_transient_retry(retry: int, deadline: float | None = None) -> bool:
+    # The update client has botocore retries turned off, so 5xx and connection errors are
+    # retried here with botocore's attempt budget. Returns False if the wait would pass the deadline.
+    delay = random.uniform(0, min(FAILURE_RETRY_MAX_DELAY, FAILURE_RETRY_BASE_DELAY * 2 ** retry))
+
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return False
+
+    # A stop requested during the wait ends it early; the next loop pass cancels the update.
+    stop_event.wait(delay)
+    return True
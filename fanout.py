@@ -0,0 +1,186 @@
+import os
+import re
+import sys
+import json
+import time
+import boto3
+import logging
+import argparse
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from colorama import Fore, Style
+
+from clients import get_client
+from executor import MAX_CLUSTER_WORKERS
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_TARGET_WORKERS = 8  # Targets (account and region pairs) processed at the same time
+ROLE_SESSION_NAME = 'ecs-fanout'
+
+
+def run_fanout(action: str, targets: list[dict], config: list[dict], converge: bool = False, max_clusters: int = MAX_CLUSTER_WORKERS, max_processes: int = MAX_TARGET_WORKERS) -> dict:
+    """
+    Run start_tag3 or stop_tag3 against several accounts and regions in parallel worker processes.
+
+    Every target runs in its own process with its own ECS client and rate limiter, so targets
+    neither share a rate budget nor wait for each other. Total time is close to the slowest target.
+
+    Parameters:
+    - action (str): "start" or "stop".
+    - targets (list[dict]): Items with a `region` and either a `profile`, a `role_arn` or both
+      (the role is then assumed from the profile).
+    - config (list[dict]): CLUSTERS entries for "start", STOP_TAGS entries for "stop".
+    - converge (bool): Only update services whose desired count differs from the target.
+    - max_clusters (int): Clusters processed at the same time within each target.
+    - max_processes (int): Targets processed at the same time.
+
+    Returns:
+    - dict: Merged report with one row per target and one row per updated service. A target
+      whose run completed with some clusters failing has status "partial" and lists them in
+      `cluster_errors`.
+    """
+    started_at = time.perf_counter()
+
+    # spawn rather than fork: boto3 clients and the scripts' thread pools are not fork-safe.
+    with ProcessPoolExecutor(max_workers=max_processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(run_target, action, target, config, converge, max_clusters) for target in targets]
+        target_reports = [future.result() for future in futures]
+
+    report = {
+        'action': action,
+        'duration_seconds': round(time.perf_counter() - started_at, 3),
+        'targets': [{key: value for key, value in target_report.items() if key != 'results'} for target_report in target_reports],
+        'services': [
+            {'target': target_report['target'], **result}
+            for target_report in target_reports
+            for result in target_report['results']
+        ],
+    }
+
+    log_fanout_report(report)
+    return report
+
+def run_target(action: str, target: dict, config: list[dict], converge: bool, max_clusters: int) -> dict:
+    """
+    Worker process entry point: point the start_tag3/stop_tag3 globals at the target and run it.
+    """
+    target_name = get_target_name(target)
+    started_at = time.perf_counter()
+
+    try:
+        session = create_session(target)
+
+        from discovery import EcsDiscovery
+        from rate_limiter import AdaptiveRateLimiter
+
+        # The script builds a default ECS client at import; make sure that has a region too.
+        os.environ.setdefault('AWS_DEFAULT_REGION', target['region'])
+        script = importlib.import_module(f"{action}_tag3")
+        script.ecs_client = get_client('ecs', session=session)
+        script.update_client = get_client('ecs', session=session, caller_throttled=True)
+        script.service_discovery = EcsDiscovery(script.ecs_client)
+        script.rate_limiter = AdaptiveRateLimiter(script.RATE_LIMIT, max_rate=script.MAX_RATE_LIMIT)
+        script.dead_letter_path = f"{action}_tag3.{re.sub(r'[^A-Za-z0-9_.-]', '_', target_name)}.dead_letter.json"
+
+        if action == 'start':
+            results = script.start_services_by_tags(config, converge=converge, max_clusters=max_clusters, raise_errors=True)
+        else:
+            results = script.stop_services_by_tags(config, converge=converge, max_clusters=max_clusters, raise_errors=True)
+
+        # Clusters that failed on their own do not raise; the target is then only partly done.
+        cluster_errors = list(script.cluster_errors)
+        status = 'partial' if cluster_errors else 'ok'
+        error = None
+
+    except Exception as e:
+        logger.error(f"Error running {action} for target {target_name}: {e}")
+        results = []
+        cluster_errors = []
+        status = 'error'
+        error = str(e)
+
+    return {
+        'target': target_name,
+        'region': target['region'],
+        'status': status,
+        'error': error,
+        'cluster_errors': cluster_errors,
+        'duration_seconds': round(time.perf_counter() - started_at, 3),
+        'updated': sum(1 for result in results if result['status'] == 'updated'),
+        'not_found': sum(1 for result in results if result['status'] == 'not_found'),
+        'failed': sum(1 for result in results if result['status'] == 'failed'),
+        'results': results,
+    }
+
+def create_session(target: dict) -> boto3.Session:
+    session = boto3.Session(profile_name=target.get('profile'), region_name=target['region'])
+
+    if not target.get('role_arn'):
+        return session
+
+    credentials = session.client('sts').assume_role(
+        RoleArn=target['role_arn'],
+        RoleSessionName=ROLE_SESSION_NAME,
+    )['Credentials']
+
+    return boto3.Session(
+        aws_access_key_id=credentials['AccessKeyId'],
+        aws_secret_access_key=credentials['SecretAccessKey'],
+        aws_session_token=credentials['SessionToken'],
+        region_name=target['region'],
+    )
+
+def get_target_name(target: dict) -> str:
+    identity = target.get('role_arn') or target.get('profile') or 'default'
+    return f"{identity}/{target['region']}"
+
+def log_fanout_report(report: dict) -> None:
+    for target in report['targets']:
+        if target['status'] == 'ok':
+            logger.info(f"{Fore.GREEN}Target {target['target']}: {target['updated']} updated, {target['not_found']} not found, {target['failed']} failed in {target['duration_seconds']:.1f}s.{Style.RESET_ALL}")
+        elif target['status'] == 'partial':
+            logger.warning(f"{Fore.YELLOW}Target {target['target']}: {target['updated']} updated, {target['not_found']} not found, {target['failed']} failed in {target['duration_seconds']:.1f}s; {len(target['cluster_errors'])} clusters failed.{Style.RESET_ALL}")
+            for cluster_error in target['cluster_errors']:
+                logger.error(f"{Fore.RED}Target {target['target']}, cluster {cluster_error['cluster']}: {cluster_error['error']}{Style.RESET_ALL}")
+        else:
+            logger.error(f"{Fore.RED}Target {target['target']} failed: {target['error']}{Style.RESET_ALL}")
+
+    logger.info(f"{len(report['services'])} services across {len(report['targets'])} targets in {report['duration_seconds']:.1f}s.")
+
+def parse_command_line_args():
+    parser = argparse.ArgumentParser(description='Run start_tag3 or stop_tag3 across several accounts and regions in parallel.')
+    parser.add_argument('action', choices=['start', 'stop'], help='Start services from CLUSTERS or stop services from STOP_TAGS')
+    parser.add_argument('--targets', help='JSON file with the targets; defaults to the FANOUT_TARGETS env variable')
+    parser.add_argument('--converge', action='store_true', help='Only update services whose desired count differs from the target')
+    parser.add_argument('--max-clusters', type=int, default=MAX_CLUSTER_WORKERS, help='Number of clusters processed at the same time within a target')
+    parser.add_argument('--max-processes', type=int, default=MAX_TARGET_WORKERS, help='Number of targets processed at the same time')
+    parser.add_argument('--report', help='Write the merged report to this JSON file')
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_command_line_args()
+
+    if args.targets:
+        with open(args.targets) as f:
+            targets = json.load(f)
+    else:
+        targets = json.loads(os.getenv('FANOUT_TARGETS', '[]'))
+
+    if not targets:
+        logger.error("No targets given. Set FANOUT_TARGETS or pass --targets.")
+        sys.exit(1)
+
+    config = json.loads(os.getenv('CLUSTERS' if args.action == 'start' else 'STOP_TAGS', '[]'))
+
+    report = run_fanout(args.action, targets, config, converge=args.converge, max_clusters=args.max_clusters, max_processes=args.max_processes)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import threading
+
+from rate_limiter import THROTTLING_ERROR_CODES
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # Seconds, Prometheus-style upper bounds
+
+
+class ApiMetrics:
+    """
+    Per-operation API call metrics collected through botocore's event system.
+
+    For every operation it records calls, errors, retries, throttled attempts and a latency
+    histogram. It also reports the time rate limiters spent sleeping.
+
+    Parameters:
+    - script (str): Name of the script, added as a label to the Prometheus metrics.
+    """
+
+    def __init__(self, script: str) -> None:
+        self.script = script
+        self._operations = {}
+        self._limiters = []
+        self._lock = threading.Lock()
+
+    def attach(self, client) -> None:
+        service_id = client.meta.service_model.service_id.hyphenize()
+
+        client.meta.events.register(f"before-call.{service_id}", self._before_call)
+        client.meta.events.register(f"after-call.{service_id}", self._after_call)
+        client.meta.events.register(f"after-call-error.{service_id}", self._after_call_error)
+        client.meta.events.register(f"needs-retry.{service_id}", self._needs_retry)
+
+    def track_sleep(self, limiter) -> None:
+        self._limiters.append(limiter)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            operations = {name: {**stats, 'buckets': list(stats['buckets'])} for name, stats in sorted(self._operations.items())}
+
+        return {
+            'script': self.script,
+            'operations': operations,
+            'rate_limiter_sleep_seconds': sum(limiter.total_sleep_time for limiter in self._limiters),
+        }
+
+    def write(self, json_path: str | None = None, prometheus_path: str | None = None) -> None:
+        snapshot = self.snapshot()
+
+        if json_path:
+            _write_atomically(json_path, json.dumps(snapshot, indent=2))
+
+        if prometheus_path:
+            _write_atomically(prometheus_path, format_prometheus(snapshot))
+
+    def _before_call(self, model, context, **kwargs) -> None:
+        context['metrics_operation'] = model.name
+        context['metrics_started_at'] = time.perf_counter()
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs) -> None:
+        error_code = parsed.get('Error', {}).get('Code')
+        retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        self._record(model.name, context, error=error_code is not None, retries=retries)
+
+    def _after_call_error(self, context, **kwargs) -> None:
+        # botocore does not pass the operation model with this event.
+        self._record(context.get('metrics_operation', 'Unknown'), context, error=True, retries=0)
+
+    def _needs_retry(self, response, operation, **kwargs) -> None:
+        if response is None:
+            return
+
+        _, parsed = response
+        if parsed.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+            with self._lock:
+                self._stats(operation.name)['throttles'] += 1
+
+    def _record(self, operation_name: str, context: dict, error: bool, retries: int) -> None:
+        started_at = context.get('metrics_started_at')
+        latency = time.perf_counter() - started_at if started_at is not None else 0.0
+
+        with self._lock:
+            stats = self._stats(operation_name)
+            stats['count'] += 1
+            stats['errors'] += int(error)
+            stats['retries'] += retries
+            stats['latency_sum'] += latency
+
+            for i, bucket in enumerate(LATENCY_BUCKETS):
+                if latency <= bucket:
+                    stats['buckets'][i] += 1
+
+    def _stats(self, operation_name: str) -> dict:
+        if operation_name not in self._operations:
+            self._operations[operation_name] = {
+                'count': 0,
+                'errors': 0,
+                'retries': 0,
+                'throttles': 0,
+                'latency_sum': 0.0,
+                'buckets': [0] * len(LATENCY_BUCKETS),
+            }
+        return self._operations[operation_name]
+
+
+def format_prometheus(snapshot: dict) -> str:
+    """
+    Render a metrics snapshot in the Prometheus text exposition format for the node exporter textfile collector.
+    """
+    script = snapshot['script']
+    lines = []
+
+    for metric, key, help_text in [
+        ('ecs_api_calls_total', 'count', 'API calls per operation.'),
+        ('ecs_api_errors_total', 'errors', 'API calls that ended in an error.'),
+        ('ecs_api_retries_total', 'retries', 'Retries performed by botocore.'),
+        ('ecs_api_throttles_total', 'throttles', 'Attempts rejected with a throttling error.'),
+    ]:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for operation, stats in snapshot['operations'].items():
+            lines.append(f'{metric}{{script="{script}",operation="{operation}"}} {stats[key]}')
+
+    lines.append("# HELP ecs_api_call_duration_seconds API call latency, including botocore retries.")
+    lines.append("# TYPE ecs_api_call_duration_seconds histogram")
+    for operation, stats in snapshot['operations'].items():
+        labels = f'script="{script}",operation="{operation}"'
+        for bucket, count in zip(LATENCY_BUCKETS, stats['buckets']):
+            lines.append(f'ecs_api_call_duration_seconds_bucket{{{labels},le="{bucket}"}} {count}')
+        lines.append(f'ecs_api_call_duration_seconds_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+        lines.append(f'ecs_api_call_duration_seconds_sum{{{labels}}} {stats["latency_sum"]}')
+        lines.append(f'ecs_api_call_duration_seconds_count{{{labels}}} {stats["count"]}')
+
+    lines.append("# HELP ecs_rate_limiter_sleep_seconds_total Time spent waiting in the rate limiter.")
+    lines.append("# TYPE ecs_rate_limiter_sleep_seconds_total counter")
+    lines.append(f'ecs_rate_limiter_sleep_seconds_total{{script="{script}"}} {snapshot["rate_limiter_sleep_seconds"]}')
+
+    return "\n".join(lines) + "\n"
+
+def _write_atomically(path: str, content: str) -> None:
+    # The textfile collector may read at any time, so never expose a half-written file.
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(content)
+    os.replace(temp_path, path)
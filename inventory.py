@@ -0,0 +1,79 @@
+import threading
+
+DESCRIBE_CLUSTERS_BATCH_SIZE = 100  # Maximum clusters per DescribeClusters call
+DESCRIBE_SERVICES_BATCH_SIZE = 10  # Maximum services per DescribeServices call
+
+
+def tags_to_dict(tags: list[dict]) -> dict:
+    return {tag['key']: tag['value'] for tag in tags or []}
+
+def chunked(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class ClusterTagIndex:
+    """
+    Memoized cluster tags for the whole run, fetched with describe_clusters(include=TAGS).
+
+    Parameters:
+    - ecs_client: boto3 ECS client.
+    """
+
+    def __init__(self, ecs_client) -> None:
+        self.ecs_client = ecs_client
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, cluster_arns: list[str]) -> None:
+        with self._lock:
+            missing = [arn for arn in dict.fromkeys(cluster_arns) if arn not in self._tags]
+
+        for batch in chunked(missing, DESCRIBE_CLUSTERS_BATCH_SIZE):
+            response = self.ecs_client.describe_clusters(clusters=batch, include=['TAGS'])
+            fetched = {arn: {} for arn in batch}
+            fetched.update({cluster['clusterArn']: tags_to_dict(cluster.get('tags')) for cluster in response.get('clusters', [])})
+
+            with self._lock:
+                self._tags.update(fetched)
+
+    def get(self, cluster_arn: str) -> dict:
+        if cluster_arn not in self._tags:
+            self.prefetch([cluster_arn])
+        return self._tags[cluster_arn]
+
+
+def list_service_arns(ecs_client, cluster_arn: str) -> list[str]:
+    services_paginator = ecs_client.get_paginator('list_services')
+    services_iterator = services_paginator.paginate(cluster=cluster_arn)
+
+    return [service_arn for services_page in services_iterator for service_arn in services_page.get('serviceArns', [])]
+
+def describe_services_inventory(ecs_client, cluster_arn: str, service_arns: list[str]) -> dict[str, dict]:
+    """
+    Fetch tags and task counts for services, 10 per describe_services(include=TAGS) call.
+
+    Parameters:
+    - ecs_client: boto3 ECS client.
+    - cluster_arn (str): Cluster the services belong to.
+    - service_arns (list[str]): Services to describe.
+
+    Returns:
+    - dict[str, dict]: Service ARN mapped to its `cluster`, `name`, `tags`, `desired_count`,
+      `running_count` and `status`.
+    """
+    inventory = {}
+
+    for batch in chunked(service_arns, DESCRIBE_SERVICES_BATCH_SIZE):
+        response = ecs_client.describe_services(cluster=cluster_arn, services=batch, include=['TAGS'])
+
+        for service in response.get('services', []):
+            inventory[service['serviceArn']] = {
+                'cluster': cluster_arn,
+                'name': service['serviceName'],
+                'tags': tags_to_dict(service.get('tags')),
+                'desired_count': service.get('desiredCount', 0),
+                'running_count': service.get('runningCount', 0),
+                'status': service.get('status'),
+            }
+
+    return inventory
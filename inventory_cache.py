@@ -0,0 +1,247 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from clients import get_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = '.inventory_cache.sqlite3'
+DEFAULT_CACHE_TTL = 3600  # Seconds before a cached cluster or service list is rediscovered
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cluster_lists (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (account, region)
+);
+CREATE TABLE IF NOT EXISTS clusters (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    cluster_arn TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    PRIMARY KEY (account, region, cluster_arn)
+);
+CREATE TABLE IF NOT EXISTS service_lists (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    cluster_arn TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (account, region, cluster_arn)
+);
+CREATE TABLE IF NOT EXISTS services (
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    cluster_arn TEXT NOT NULL,
+    service_arn TEXT NOT NULL,
+    name TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    desired_count INTEGER,
+    running_count INTEGER,
+    status TEXT,
+    PRIMARY KEY (account, region, service_arn)
+);
+"""
+
+
+class InventoryCache:
+    """
+    SQLite store of cluster and service inventory for one account and region.
+
+    Parameters:
+    - path (str): SQLite database file.
+    - account (str): AWS account ID the inventory belongs to.
+    - region (str): AWS region the inventory belongs to.
+    """
+
+    def __init__(self, path: str, account: str, region: str) -> None:
+        self.account = account
+        self.region = region
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get_clusters(self, not_before: float) -> dict[str, dict] | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fetched_at FROM cluster_lists WHERE account = ? AND region = ?",
+                (self.account, self.region),
+            ).fetchone()
+
+            if row is None or row[0] < not_before:
+                return None
+
+            rows = self._connection.execute(
+                "SELECT cluster_arn, tags FROM clusters WHERE account = ? AND region = ?",
+                (self.account, self.region),
+            ).fetchall()
+
+        return {cluster_arn: json.loads(tags) for cluster_arn, tags in rows}
+
+    def put_clusters(self, cluster_tags: dict[str, dict]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM clusters WHERE account = ? AND region = ?",
+                (self.account, self.region),
+            )
+            self._connection.executemany(
+                "INSERT INTO clusters VALUES (?, ?, ?, ?)",
+                [(self.account, self.region, cluster_arn, json.dumps(tags)) for cluster_arn, tags in cluster_tags.items()],
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cluster_lists VALUES (?, ?, ?)",
+                (self.account, self.region, time.time()),
+            )
+
+    def get_services(self, cluster_arn: str, not_before: float) -> dict[str, dict] | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fetched_at FROM service_lists WHERE account = ? AND region = ? AND cluster_arn = ?",
+                (self.account, self.region, cluster_arn),
+            ).fetchone()
+
+            if row is None or row[0] < not_before:
+                return None
+
+            rows = self._connection.execute(
+                "SELECT service_arn, name, tags, desired_count, running_count, status FROM services "
+                "WHERE account = ? AND region = ? AND cluster_arn = ?",
+                (self.account, self.region, cluster_arn),
+            ).fetchall()
+
+        return {
+            service_arn: {
+                'cluster': cluster_arn,
+                'name': name,
+                'tags': json.loads(tags),
+                'desired_count': desired_count,
+                'running_count': running_count,
+                'status': status,
+            }
+            for service_arn, name, tags, desired_count, running_count, status in rows
+        }
+
+    def put_services(self, cluster_arn: str, services: dict[str, dict]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM services WHERE account = ? AND region = ? AND cluster_arn = ?",
+                (self.account, self.region, cluster_arn),
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO services VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.account, self.region, cluster_arn, service_arn, service['name'], json.dumps(service['tags']),
+                        service['desired_count'], service['running_count'], service['status'],
+                    )
+                    for service_arn, service in services.items()
+                ],
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO service_lists VALUES (?, ?, ?, ?)",
+                (self.account, self.region, cluster_arn, time.time()),
+            )
+
+    def set_desired_count(self, cluster_arn: str, service_name: str, desired_count: int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE services SET desired_count = ? WHERE account = ? AND region = ? AND cluster_arn = ? AND name = ?",
+                (desired_count, self.account, self.region, cluster_arn, service_name),
+            )
+
+    def invalidate_service(self, cluster_arn: str, service_name: str) -> None:
+        """
+        Forget a service and mark its cluster's service list stale so the next run rediscovers it.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM services WHERE account = ? AND region = ? AND cluster_arn = ? AND name = ?",
+                (self.account, self.region, cluster_arn, service_name),
+            )
+            self._connection.execute(
+                "DELETE FROM service_lists WHERE account = ? AND region = ? AND cluster_arn = ?",
+                (self.account, self.region, cluster_arn),
+            )
+
+
+class CachedDiscovery:
+    """
+    Discovery backend wrapper that serves clusters, tags and services from an InventoryCache.
+
+    Parameters:
+    - backend: EcsDiscovery or TaggingApiDiscovery used on a cache miss.
+    - cache (InventoryCache): Inventory store for the current account and region.
+    - ttl (float): Seconds a cached list stays valid.
+    - refresh (bool): Ignore anything cached before this run.
+    - live_counts (bool): Re-describe cached services so desired and running counts are current.
+      Needed whenever the counts drive a decision (converge, snapshot, plan), because the cached
+      counts miss any scaling done outside these scripts.
+    """
+
+    def __init__(self, backend, cache: InventoryCache, ttl: float = DEFAULT_CACHE_TTL, refresh: bool = False, live_counts: bool = False) -> None:
+        self.backend = backend
+        self.cache = cache
+        self.not_before = time.time() if refresh else time.time() - ttl
+        self.live_counts = live_counts
+        self._cluster_tags = None
+        self._lock = threading.Lock()
+
+    def list_cluster_arns(self) -> list[str]:
+        return list(self._load_cluster_tags())
+
+    def get_cluster_tags(self, cluster_arn: str) -> dict:
+        cluster_tags = self._load_cluster_tags()
+
+        if cluster_arn not in cluster_tags:
+            return self.backend.get_cluster_tags(cluster_arn)
+
+        return cluster_tags[cluster_arn]
+
+    def describe_services(self, cluster_arn: str) -> dict[str, dict]:
+        services = self.cache.get_services(cluster_arn, self.not_before)
+
+        if services is None:
+            services = self.backend.describe_services(cluster_arn)
+            self.cache.put_services(cluster_arn, services)
+        elif self.live_counts:
+            # Skips list_services, but the counts come from describe_services, not from the cache.
+            services = self.backend.describe_service_arns(cluster_arn, list(services))
+            logger.info(f"Using cached list of {len(services)} services for cluster {cluster_arn} with live desired counts")
+        else:
+            logger.info(f"Using cached inventory of {len(services)} services for cluster {cluster_arn}")
+
+        return services
+
+    def record_results(self, results: list[dict]) -> None:
+        for result in results:
+            if result['status'] == 'updated':
+                self.cache.set_desired_count(result['cluster'], result['service'], result['desired_count'])
+            elif result['status'] == 'not_found':
+                self.cache.invalidate_service(result['cluster'], result['service'])
+
+    def _load_cluster_tags(self) -> dict[str, dict]:
+        with self._lock:
+            if self._cluster_tags is None:
+                self._cluster_tags = self.cache.get_clusters(self.not_before)
+
+                if self._cluster_tags is None:
+                    self._cluster_tags = {
+                        cluster_arn: self.backend.get_cluster_tags(cluster_arn)
+                        for cluster_arn in self.backend.list_cluster_arns()
+                    }
+                    self.cache.put_clusters(self._cluster_tags)
+                else:
+                    logger.info(f"Using cached inventory of {len(self._cluster_tags)} clusters")
+
+            return self._cluster_tags
+
+
+def open_inventory_cache(ecs_client, path: str = DEFAULT_CACHE_PATH) -> InventoryCache:
+    """
+    Open the inventory cache for the account and region the ECS client talks to.
+    """
+    account = get_client('sts').get_caller_identity()['Account']
+    return InventoryCache(path, account, ecs_client.meta.region_name)
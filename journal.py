@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SYNC_BATCH = 50  # Records written before the journal is fsynced
+JOURNAL_SYNC_INTERVAL = 1.0  # Seconds after which buffered records are fsynced anyway
+RESUMABLE_STATUSES = ('updated', 'not_found')  # Completed statuses that a resumed run does not retry
+
+
+class RunJournal:
+    """
+    Append-only JSON lines journal of the service updates a run planned and completed.
+
+    Records are fsynced in batches, so a crash loses at most the last batch. The updates in
+    that batch are simply applied again on resume, which is safe because setting a desired
+    count is idempotent. A torn last line is ignored when the journal is read back.
+
+    Parameters:
+    - path (str): Journal file.
+    - resume (bool): Keep the existing journal and skip the updates it marks as completed.
+    """
+
+    def __init__(self, path: str, resume: bool = False) -> None:
+        self.path = path
+        self.completed = load_completed_updates(path) if resume else set()
+        self._file = open(path, 'a' if resume else 'w')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+        if resume:
+            logger.info(f"Resuming from journal {path} with {len(self.completed)} completed updates")
+
+    def skip_completed(self, updates: list[dict]) -> list[dict]:
+        return [update for update in updates if _update_key(update) not in self.completed]
+
+    def record_planned(self, updates: list[dict]) -> None:
+        self._append([{'event': 'planned', **_update_fields(update)} for update in updates])
+
+    def record_completed(self, result: dict) -> None:
+        self._append([{'event': 'completed', **_update_fields(result), 'status': result['status']}])
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+    def _append(self, records: list[dict]) -> None:
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+
+        with self._lock:
+            self._file.write(lines)
+            self._unsynced += len(records)
+
+            if self._unsynced >= JOURNAL_SYNC_BATCH or time.monotonic() - self._last_sync >= JOURNAL_SYNC_INTERVAL:
+                self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+
+def load_completed_updates(path: str) -> set[tuple]:
+    completed = set()
+
+    if not os.path.exists(path):
+        return completed
+
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Only the last line can be torn by a crash; everything before it was fsynced.
+                continue
+
+            if record['event'] == 'completed' and record['status'] in RESUMABLE_STATUSES:
+                completed.add(_update_key(record))
+
+    return completed
+
+def _update_fields(update: dict) -> dict:
+    return {'cluster': update['cluster'], 'service': update['service'], 'desired_count': update['desired_count']}
+
+def _update_key(update: dict) -> tuple:
+    # The target count is part of the key, so a stop journal never hides the matching start.
+    return update['cluster'], update['service'], update['desired_count']
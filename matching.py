@@ -0,0 +1,68 @@
+import logging
+
+from tag_selectors import service_selector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DESIRED_COUNT = 1  # Desired count for a tagged service whose tag value is not in the config
+
+
+class ServiceCountIndex:
+    """
+    Inverted index from CLUSTERS config entries: service tag value -> desired count.
+
+    Entries with a `service_tag_key` only match that tag key. Entries without one keep the
+    original behaviour and match any of a service's tag values. Later entries override earlier
+    ones for the same tag value, as the serial per-entry loop used to.
+
+    If every entry has a `service_selector`, only services matching at least one of them are
+    resolved; otherwise any service can be.
+
+    Parameters:
+    - entries (list[dict]): CLUSTERS entries that matched one cluster, in config order.
+    """
+
+    def __init__(self, entries: list[dict]) -> None:
+        self._counts_by_key = {}
+        self._counts_any_key = {}
+        self._has_any_key_entries = False
+        self._service_selectors = [service_selector(entry) for entry in entries]
+
+        for entry in entries:
+            service_tag_key = entry.get('service_tag_key')
+
+            if service_tag_key:
+                self._counts_by_key.setdefault(service_tag_key, {}).update(entry.get('services', {}))
+            else:
+                self._counts_any_key.update(entry.get('services', {}))
+                self._has_any_key_entries = True
+
+    def resolve(self, service_name: str, service_tags: dict) -> int | None:
+        """
+        Resolve a service to a single desired count, or None when it should be skipped.
+        """
+        if all(self._service_selectors) and not any(selector.matches(service_tags) for selector in self._service_selectors):
+            return None
+
+        for service_tag_key, counts in self._counts_by_key.items():
+            service_tag_value = service_tags.get(service_tag_key)
+            if service_tag_value is not None:
+                return counts.get(service_tag_value, DEFAULT_DESIRED_COUNT)
+
+        if not self._has_any_key_entries or not service_tags:
+            return None
+
+        matches = {
+            tag_key: self._counts_any_key[tag_value]
+            for tag_key, tag_value in sorted(service_tags.items())
+            if tag_value in self._counts_any_key
+        }
+
+        if not matches:
+            return DEFAULT_DESIRED_COUNT
+
+        if len(set(matches.values())) > 1:
+            tag_key = next(iter(matches))
+            logger.warning(f"Service {service_name} matches several tag values with different desired counts {matches}. Using tag {tag_key}; set service_tag_key to choose one.")
+
+        return next(iter(matches.values()))
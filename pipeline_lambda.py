@@ -1,34 +1,45 @@
-import boto3
+import os
+import json
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
 
-def lambda_handler(event, context):
-    # define the tag key and value to identify pipelines
-    tag_key = 'Env'
-    tag_value = 'prod'
+from clients import MAX_RETRY_ATTEMPTS, get_client
+from rate_limiter import AdaptiveRateLimiter, is_throttling_error, is_transient_error
 
-    codepipeline = boto3.client('codepipeline')
+# define the tag key and value to identify pipelines (the event can override them)
+TAG_KEY = 'Env'
+TAG_VALUE = 'prod'
 
-    try:
-        response = codepipeline.list_pipelines()
-        pipelines = response['pipelines']
+MAX_PIPELINE_WORKERS = 10  # Pipelines checked and started at the same time
+MAX_THROTTLE_RETRIES = 8  # Attempts per call after CodePipeline throttles it
+MAX_TRANSIENT_RETRIES = MAX_RETRY_ATTEMPTS - 1  # Retries after a 5xx or connection error, as botocore's standard mode would make
+PIPELINE_RATE_LIMIT = float(os.getenv('PIPELINE_RATE_LIMIT', 10))  # Starting calls per second for the CodePipeline API
+MAX_PIPELINE_RATE_LIMIT = float(os.getenv('MAX_PIPELINE_RATE_LIMIT', 20))  # Ceiling the adaptive rate ramps up to
+
+# Kept for the lifetime of the execution environment and reused by warm invocations.
+codepipeline = get_client('codepipeline')
+throttled_codepipeline = get_client('codepipeline', caller_throttled=True)  # For call_with_backoff; botocore leaves its throttles to rate_limiter
+rate_limiter = AdaptiveRateLimiter(PIPELINE_RATE_LIMIT, max_rate=MAX_PIPELINE_RATE_LIMIT)
+_arn_prefix = None
 
-        for pipeline in pipelines:
-            pipeline_name = pipeline['name']
+def lambda_handler(event, context):
+    tag_key = event.get('tag_key', TAG_KEY)
+    tag_value = event.get('tag_value', TAG_VALUE)
+
+    try:
+        arn_prefix = get_arn_prefix()
+        pipeline_names = list_pipeline_names()
 
-            try:
-                response_tags = codepipeline.list_tags_for_resource(resourceArn=f'arn:aws:codepipeline:us-east-1:507698722484:{pipeline_name}')
+        with ThreadPoolExecutor(max_workers=MAX_PIPELINE_WORKERS) as pool:
+            results = list(pool.map(lambda pipeline_name: trigger_pipeline(arn_prefix, pipeline_name, tag_key, tag_value), pipeline_names))
 
-                for tag in response_tags['tags']:
-                    if tag['key'] == tag_key and tag['value'] == tag_value:
-                        response_execution = codepipeline.start_pipeline_execution(name=pipeline_name)
-                        print(f"Pipeline execution started for {pipeline_name}: {response_execution}")
-            except codepipeline.exceptions.PipelineNotFoundException:
-                print(f"Pipeline '{pipeline_name}' not found. Skipping.")
-            except Exception as e:
-                print(f"Error processing pipeline '{pipeline_name}': {e}")
+        summary = {status: sum(1 for result in results if result['status'] == status) for status in ('started', 'skipped', 'not_found', 'failed')}
+        print(f"Pipeline executions finished for {len(results)} pipelines: {summary}")
 
         return {
             'statusCode': 200,
-            'body': "Pipeline executions started successfully."
+            'body': json.dumps({**summary, 'pipelines': results})
         }
 
     except Exception as e:
@@ -38,3 +49,75 @@ def lambda_handler(event, context):
             'body': f"Error starting pipeline executions: {e}"
         }
 
+def get_arn_prefix() -> str:
+    """
+    Build the "arn:<partition>:codepipeline:<region>:<account>:" prefix once per container,
+    from the caller identity and the session region.
+    """
+    global _arn_prefix
+
+    if _arn_prefix is None:
+        identity = get_client('sts').get_caller_identity()
+        partition = identity['Arn'].split(':')[1]
+        _arn_prefix = f"arn:{partition}:codepipeline:{codepipeline.meta.region_name}:{identity['Account']}:"
+
+    return _arn_prefix
+
+def list_pipeline_names() -> list[str]:
+    pipelines_paginator = codepipeline.get_paginator('list_pipelines')
+
+    return [
+        pipeline['name']
+        for pipelines_page in pipelines_paginator.paginate()
+        for pipeline in pipelines_page.get('pipelines', [])
+    ]
+
+def trigger_pipeline(arn_prefix: str, pipeline_name: str, tag_key: str, tag_value: str) -> dict:
+    try:
+        response_tags = call_with_backoff(throttled_codepipeline.list_tags_for_resource, resourceArn=f"{arn_prefix}{pipeline_name}")
+
+        if not any(tag['key'] == tag_key and tag['value'] == tag_value for tag in response_tags.get('tags', [])):
+            return {'pipeline': pipeline_name, 'status': 'skipped'}
+
+        response_execution = call_with_backoff(throttled_codepipeline.start_pipeline_execution, name=pipeline_name)
+        print(f"Pipeline execution started for {pipeline_name}: {response_execution['pipelineExecutionId']}")
+
+        return {'pipeline': pipeline_name, 'status': 'started', 'execution_id': response_execution['pipelineExecutionId']}
+
+    except (codepipeline.exceptions.PipelineNotFoundException, codepipeline.exceptions.ResourceNotFoundException):
+        print(f"Pipeline '{pipeline_name}' not found. Skipping.")
+        return {'pipeline': pipeline_name, 'status': 'not_found'}
+    except Exception as e:
+        print(f"Error processing pipeline '{pipeline_name}': {e}")
+        return {'pipeline': pipeline_name, 'status': 'failed', 'error': str(e)}
+
+def call_with_backoff(operation, **kwargs) -> dict:
+    """
+    Call a CodePipeline operation through the shared adaptive rate limiter, halving the rate
+    and retrying whenever the call is throttled. 5xx and connection errors get the retries
+    botocore's standard mode would make, since the caller-throttled client does not retry.
+    """
+    throttle_retries = 0
+    transient_retries = 0
+
+    while True:
+        rate_limiter.acquire()
+
+        try:
+            response = operation(**kwargs)
+            rate_limiter.on_success()
+            return response
+        except Exception as e:
+            if isinstance(e, codepipeline.exceptions.ClientError) and is_throttling_error(e) and throttle_retries < MAX_THROTTLE_RETRIES:
+                throttle_retries += 1
+                rate = rate_limiter.on_throttle()
+                print(f"Throttled calling {operation.__name__}. Retrying at {rate:.1f} calls/sec.")
+                continue
+
+            if is_transient_error(e) and transient_retries < MAX_TRANSIENT_RETRIES:
+                time.sleep(random.uniform(0, 2 ** transient_retries))
+                transient_retries += 1
+                print(f"Transient error calling {operation.__name__}: {e}. Retrying.")
+                continue
+
+            raise
@@ -0,0 +1,63 @@
+import os
+import json
+import time
+
+PLAN_VERSION = 1  # Bumped whenever the plan file layout changes
+PLAN_FIELDS = ('cluster', 'service', 'desired_count', 'current_count')
+
+
+def write_plan(path: str, action: str, region: str, updates: list[dict]) -> None:
+    """
+    Write the updates resolved by a plan run, so a later apply can execute them without rediscovery.
+
+    Parameters:
+    - path (str): JSON file the plan is written to.
+    - action (str): "start" or "stop", for whoever reads the plan.
+    - region (str): Region the inventory was discovered in; apply refuses to run elsewhere.
+    - updates (list[dict]): One row per service with cluster, service, desired_count and current_count.
+    """
+    plan = {
+        'version': PLAN_VERSION,
+        'action': action,
+        'region': region,
+        'created_at': time.time(),
+        'updates': updates,
+    }
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(plan, f, indent=2)
+    os.replace(temp_path, path)
+
+def write_dead_letter(path: str, action: str, region: str, results: list[dict]) -> int:
+    """
+    Write the updates that still failed after retries as a plan, so `--apply PATH` retries exactly those.
+
+    When nothing failed, an existing file is removed instead, so a dead letter left by an
+    earlier run cannot later replay counts this run has superseded.
+
+    Returns:
+    - int: Number of failed updates written.
+    """
+    failed_updates = [
+        {field: result.get(field) for field in PLAN_FIELDS}
+        for result in results
+        if result['status'] == 'failed'
+    ]
+
+    if not failed_updates:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+
+    write_plan(path, action, region, failed_updates)
+    return len(failed_updates)
+
+def load_plan(path: str) -> dict:
+    with open(path) as f:
+        plan = json.load(f)
+
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f"Plan {path} has version {plan.get('version')}, expected {PLAN_VERSION}")
+
+    return plan
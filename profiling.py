@@ -0,0 +1,152 @@
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+
+from instrumentation import ApiMetrics
+
+logger = logging.getLogger(__name__)
+
+# Phases backed by API calls, in the order a run goes through them.
+PHASE_OPERATIONS = {
+    'list_clusters': ('ListClusters',),
+    'cluster_tags': ('DescribeClusters',),
+    'list_services': ('ListServices',),
+    'service_tags': ('DescribeServices',),
+    'update_service': ('UpdateService',),
+}
+
+# From 3.12 cProfile runs on sys.monitoring: one active profiler per process, covering every thread.
+PROCESS_WIDE_PROFILE = sys.version_info >= (3, 12)
+
+
+class PhaseProfiler(ApiMetrics):
+    """
+    Per-phase timing of a start/stop run, with an optional cProfile capture of every thread.
+
+    API phases are measured through the same botocore hooks as ApiMetrics. Local phases are
+    measured with `phase(name)`. For each phase it reports the call count, the summed call
+    time (which can exceed the wall time when calls overlap) and the wall time from the first
+    call's start to the last call's end. Rate limiter sleep is reported as the `sleep` phase.
+
+    Parameters:
+    - script (str): Name of the script, stored in the profile.
+    """
+
+    def __init__(self, script: str) -> None:
+        super().__init__(script)
+        self._spans = {}
+        self._local_phases = {}
+        self._profiles = []
+        self._started_at = None
+
+    def start(self, capture_pstats: bool = False) -> None:
+        self._started_at = time.perf_counter()
+
+        if capture_pstats:
+            if not PROCESS_WIDE_PROFILE:
+                # Worker threads each get their own profiler; they are merged when the run ends.
+                threading.setprofile(self._profile_thread)
+            self._profile_thread()
+
+    @contextmanager
+    def phase(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended_at = time.perf_counter()
+            with self._lock:
+                stats = self._local_phases.setdefault(name, {'calls': 0, 'seconds': 0.0})
+                stats['calls'] += 1
+                stats['seconds'] += ended_at - started_at
+                self._extend_span(name, started_at, ended_at)
+
+    def report(self) -> dict:
+        snapshot = self.snapshot()
+        operations = snapshot['operations']
+        phases = {}
+
+        for name, operation_names in PHASE_OPERATIONS.items():
+            with self._lock:
+                spans = [self._spans[operation] for operation in operation_names if operation in self._spans]
+            phases[name] = {
+                'calls': sum(operations.get(operation, {}).get('count', 0) for operation in operation_names),
+                'seconds': sum(operations.get(operation, {}).get('latency_sum', 0.0) for operation in operation_names),
+                'wall_seconds': max(end for _, end in spans) - min(start for start, _ in spans) if spans else 0.0,
+            }
+
+        with self._lock:
+            for name, stats in self._local_phases.items():
+                start, end = self._spans[name]
+                phases[name] = {**stats, 'wall_seconds': end - start}
+
+        phases['sleep'] = {
+            'calls': None,
+            'seconds': snapshot['rate_limiter_sleep_seconds'],
+            'wall_seconds': None,
+        }
+
+        return {
+            'script': self.script,
+            'wall_seconds': time.perf_counter() - self._started_at,
+            'phases': phases,
+            'operations': operations,
+        }
+
+    def finish(self, output_path: str | None = None, pstats_path: str | None = None) -> dict:
+        threading.setprofile(None)
+        report = self.report()
+        log_profile_report(report)
+
+        if output_path:
+            with open(output_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Wrote profile to {output_path}")
+
+        if pstats_path and self._profiles:
+            stats = pstats.Stats(*self._profiles)
+            stats.dump_stats(pstats_path)
+            logger.info(f"Wrote cProfile stats to {pstats_path}")
+
+        return report
+
+    def _record(self, operation_name: str, context: dict, error: bool, retries: int) -> None:
+        super()._record(operation_name, context, error, retries)
+
+        started_at = context.get('metrics_started_at')
+        if started_at is not None:
+            with self._lock:
+                self._extend_span(operation_name, started_at, time.perf_counter())
+
+    def _extend_span(self, name: str, started_at: float, ended_at: float) -> None:
+        start, end = self._spans.get(name, (started_at, ended_at))
+        self._spans[name] = (min(start, started_at), max(end, ended_at))
+
+    def _profile_thread(self, *args) -> None:
+        # Called from the starting thread, and before 3.12 from each new thread on its first profiling event.
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+
+def timed_phase(profiler: PhaseProfiler | None, name: str):
+    return profiler.phase(name) if profiler is not None else nullcontext()
+
+def log_profile_report(report: dict) -> None:
+    lines = [f"{'phase':<20}{'calls':>8}{'seconds':>12}{'wall s':>10}"]
+
+    for name, stats in report['phases'].items():
+        calls = '-' if stats['calls'] is None else stats['calls']
+        wall_seconds = '-' if stats['wall_seconds'] is None else f"{stats['wall_seconds']:.3f}"
+        lines.append(f"{name:<20}{calls:>8}{stats['seconds']:>12.3f}{wall_seconds:>10}")
+
+    lines.append(f"{'total':<20}{'':>8}{'':>12}{report['wall_seconds']:>10.3f}")
+    logger.info(f"Profile of {report['script']}:\n" + "\n".join(lines))
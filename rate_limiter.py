@@ -0,0 +1,104 @@
+import threading
+import time
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+
+THROTTLING_ERROR_CODES = {'ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded'}
+TRANSIENT_ERROR_CODES = {'RequestTimeout', 'RequestTimeoutException', 'PriorRequestNotComplete'}
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker issuing ECS API calls.
+
+    Parameters:
+    - rate (float): Tokens added per second, i.e. the sustained calls per second.
+    - burst (int): Maximum number of tokens that can accumulate while idle.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_sleep_time = 0.0
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait_time = (1 - self._tokens) / self.rate
+                self.total_sleep_time += wait_time
+
+            time.sleep(wait_time)
+
+    def on_success(self) -> None:
+        pass
+
+    def on_throttle(self) -> float:
+        return self.rate
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    Token bucket whose rate follows AIMD: it grows additively while calls succeed and
+    is cut multiplicatively when ECS throttles a call.
+
+    Parameters:
+    - rate (float): Starting calls per second.
+    - min_rate (float): Lowest rate the limiter backs off to.
+    - max_rate (float): Highest rate the limiter ramps up to.
+    - increase (float): Calls per second added for every `rate` successful calls.
+    - decrease_factor (float): Multiplier applied to the rate on throttling.
+    - burst (int): Maximum number of tokens that can accumulate while idle.
+    """
+
+    def __init__(self, rate: float, min_rate: float = 1, max_rate: float = 50, increase: float = 1, decrease_factor: float = 0.5, burst: int = 1) -> None:
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self._last_decrease = 0.0
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+
+            # Throttles from calls already in flight belong to the same congestion event.
+            if now - self._last_decrease >= 1:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._last_decrease = now
+
+            return self.rate
+
+
+def is_throttling_error(error) -> bool:
+    return error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+def is_transient_error(error) -> bool:
+    """
+    Whether botocore's standard retry mode would retry the error as transient: a 5xx response,
+    a request timeout or a connection error. Callers of a get_client(caller_throttled=True)
+    client retry these themselves, since that client does not.
+    """
+    if isinstance(error, ClientError):
+        return (
+            error.response.get('Error', {}).get('Code') in TRANSIENT_ERROR_CODES
+            or error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') in TRANSIENT_STATUS_CODES
+        )
+
+    return isinstance(error, (BotocoreConnectionError, HTTPClientError))
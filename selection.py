@@ -0,0 +1,103 @@
+import logging
+from botocore.exceptions import ClientError
+
+from matching import ServiceCountIndex
+from tag_selectors import entry_selector, service_selector
+
+logger = logging.getLogger(__name__)
+
+# Shared by start_tag3.py, stop_tag3.py and ecs_lambda.py: which clusters and services a
+# CLUSTERS or STOP_TAGS config acts on, and the updates that follow from it. Kept free of
+# colorama and dotenv so the Lambda can import it.
+
+
+def get_cluster_tags(service_discovery, cluster_arn: str) -> dict | None:
+    """
+    Tags of a cluster, or None when they cannot be read; such a cluster matches no entry.
+    """
+    try:
+        return service_discovery.get_cluster_tags(cluster_arn)
+
+    except ClientError as e:
+        error_message = e.response.get('Error', {}).get('Message')
+        logger.error(f"Error checking tags for cluster {cluster_arn}. Message: {error_message}")
+        return None
+
+def index_start_clusters(service_discovery, cluster_arns: list[str], clusters: list[dict]) -> dict[str, ServiceCountIndex]:
+    """
+    Match CLUSTERS entries against clusters.
+
+    Returns:
+    - dict[str, ServiceCountIndex]: Cluster ARN mapped to one index folding every entry that
+      matched it, so each service resolves to one update.
+    """
+    cluster_entries = {}
+
+    for cluster in clusters:
+        cluster_selector = entry_selector(cluster, 'tag_key', 'tag_value')
+
+        for cluster_arn in cluster_arns:
+            cluster_tags = get_cluster_tags(service_discovery, cluster_arn)
+
+            if cluster_tags is not None and cluster_selector.matches(cluster_tags):
+                cluster_entries.setdefault(cluster_arn, []).append(cluster)
+
+    return {cluster_arn: ServiceCountIndex(entries) for cluster_arn, entries in cluster_entries.items()}
+
+def resolve_start_updates(cluster_arn: str, service_inventory: dict[str, dict], service_counts: ServiceCountIndex) -> list[dict]:
+    updates = []
+
+    for service in service_inventory.values():
+        service_name = service['name']
+        desired_count = service_counts.resolve(service_name, service['tags'])
+
+        if desired_count is None:
+            logger.warning(f"Tag value not found for service {service_name} in cluster {cluster_arn}. Skipping service.")
+            continue
+
+        updates.append({'cluster': cluster_arn, 'service': service_name, 'desired_count': desired_count, 'current_count': service['desired_count']})
+
+    return updates
+
+def filter_stop_clusters(service_discovery, cluster_arns: list[str], tags: list[dict]) -> list[str]:
+    # Built up front, so an invalid entry stops the run before any cluster is selected.
+    cluster_selectors = [entry_selector(tag) for tag in tags]
+    filtered_clusters = []
+
+    for cluster_arn in cluster_arns:
+        cluster_tags = get_cluster_tags(service_discovery, cluster_arn)
+
+        if cluster_tags is not None and any(cluster_selector.matches(cluster_tags) for cluster_selector in cluster_selectors):
+            filtered_clusters.append(cluster_arn)
+
+    return filtered_clusters
+
+def select_stop_services(service_inventory: dict[str, dict], cluster_tags: dict, tags: list[dict]) -> dict[str, dict]:
+    """
+    Narrow a cluster's services to those the STOP_TAGS entries matching the cluster act on.
+    """
+    service_selectors = [service_selector(tag) for tag in tags if entry_selector(tag).matches(cluster_tags)]
+
+    # A STOP_TAGS entry without a service_selector stops every service in its clusters.
+    if not service_selectors or not all(service_selectors):
+        return service_inventory
+
+    return {
+        service_arn: service for service_arn, service in service_inventory.items()
+        if any(selector.matches(service['tags']) for selector in service_selectors)
+    }
+
+def resolve_stop_updates(cluster_arn: str, service_inventory: dict[str, dict]) -> list[dict]:
+    updates = []
+
+    for service in service_inventory.values():
+        service_name = service['name']
+
+        # Tagging API discovery does not know the status, hence None.
+        if service['status'] not in ('ACTIVE', None):
+            logger.warning(f"Service {service_name} in cluster {cluster_arn} is {service['status']}. Skipping service.")
+            continue
+
+        updates.append({'cluster': cluster_arn, 'service': service_name, 'desired_count': 0, 'current_count': service['desired_count']})
+
+    return updates
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import threading
+
+
+class DesiredCountSnapshot:
+    """
+    Desired counts of services before a stop, so a later start can restore them exactly.
+
+    The file maps cluster ARN -> service ARN -> desired count. Recording merges into an
+    existing snapshot and ignores services already at 0, so stopping twice keeps the counts
+    from before the first stop. A restore discards the services it brought back, so the next
+    stop cycle starts from a fresh snapshot.
+
+    Parameters:
+    - path (str): JSON file the snapshot is read from and written to.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.clusters = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self.clusters = json.load(f).get('clusters', {})
+
+    def record(self, cluster_arn: str, service_inventory: dict[str, dict]) -> int:
+        previous_counts = {
+            service_arn: service['desired_count']
+            for service_arn, service in service_inventory.items()
+            if service['desired_count']
+        }
+
+        with self._lock:
+            self.clusters.setdefault(cluster_arn, {}).update(previous_counts)
+
+        return len(previous_counts)
+
+    def discard(self, results: list[dict]) -> int:
+        """
+        Forget the services a restore updated or found deleted; failed ones stay for the next restore.
+        """
+        done = {(result['cluster'], result['service']) for result in results if result['status'] in ('updated', 'not_found')}
+        discarded = 0
+
+        with self._lock:
+            for cluster_arn, services in list(self.clusters.items()):
+                for service_arn in list(services):
+                    if (cluster_arn, service_arn.split('/')[-1]) in done:
+                        del services[service_arn]
+                        discarded += 1
+
+                if not services:
+                    del self.clusters[cluster_arn]
+
+        return discarded
+
+    def save(self) -> None:
+        # Clusters save concurrently, so the whole write happens under the lock.
+        with self._lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'created_at': time.time(), 'clusters': self.clusters}, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+
+    def to_updates(self) -> list[dict]:
+        return [
+            {'cluster': cluster_arn, 'service': service_arn.split('/')[-1], 'desired_count': desired_count}
+            for cluster_arn, services in self.clusters.items()
+            for service_arn, desired_count in services.items()
+        ]
@@ -1,4 +1,3 @@
-import boto3
 import json
 import logging
 import os
@@ -6,12 +5,14 @@ import time
 from dotenv import load_dotenv
 from typing import Dict
 
+from clients import get_client
+
 load_dotenv()  
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client('ecs')
+ecs_client = get_client('ecs')
 
 def start_ecs_service(cluster_name: str, service_name: str, desired_counts: Dict[str, int]) -> None:
     """
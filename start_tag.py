@@ -1,5 +1,4 @@
 import os
-import boto3
 import logging
 import json
 import sys
@@ -8,12 +7,16 @@ import traceback
 from dotenv import load_dotenv
 from colorama import Fore, Style
 
+from clients import get_client
+from inventory import ClusterTagIndex, describe_services_inventory
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client("ecs")
+ecs_client = get_client('ecs')
+cluster_tag_index = ClusterTagIndex(ecs_client)
 
 def start_services_by_tags(clusters: list[dict]) -> None:
     try:
@@ -24,6 +27,7 @@ def start_services_by_tags(clusters: list[dict]) -> None:
 
             response = ecs_client.list_clusters()
             cluster_arns = response.get('clusterArns', [])
+            cluster_tag_index.prefetch(cluster_arns)
 
             filtered_clusters = [
                 cluster_arn for cluster_arn in cluster_arns
@@ -33,19 +37,16 @@ def start_services_by_tags(clusters: list[dict]) -> None:
             for cluster_arn in filtered_clusters:
                 logger.info(f"Checking services in cluster {cluster_arn}")
 
-                cluster_tags_response = ecs_client.list_tags_for_resource(resourceArn=cluster_arn)
-                cluster_tags = {tag['key']: tag['value'] for tag in cluster_tags_response.get('tags', {})}
+                cluster_tags = cluster_tag_index.get(cluster_arn)
                 logger.info(f"{Fore.CYAN}Cluster {cluster_arn} with tag value: {cluster_tags.get(tag_key)}{Style.RESET_ALL}")
 
                 services_arns = ecs_client.list_services(cluster=cluster_arn).get('serviceArns', [])
+                service_inventory = describe_services_inventory(ecs_client, cluster_arn, services_arns)
 
-                for service_arn in services_arns:
-                    service_name = service_arn.split('/')[-1]
-
-                    service_tags_response = ecs_client.list_tags_for_resource(resourceArn=service_arn)
-                    service_tags = {tag['key']: tag['value'] for tag in service_tags_response.get('tags', {})}
+                for service in service_inventory.values():
+                    service_name = service['name']
 
-                    for service_tag_value in service_tags.values():
+                    for service_tag_value in service['tags'].values():
                         if service_tag_value is not None:
                             desired_count = services.get(service_tag_value, 0)
 
@@ -68,8 +69,7 @@ def start_services_by_tags(clusters: list[dict]) -> None:
 
 def cluster_has_all_tags(cluster_arn: str, tag_key: str, tag_value: str) -> bool:
     try:
-        response = ecs_client.list_tags_for_resource(resourceArn=cluster_arn)
-        cluster_tags = {tag['key']: tag['value'] for tag in response.get('tags', {})}
+        cluster_tags = cluster_tag_index.get(cluster_arn)
 
         cluster_has_tags = cluster_tags.get(tag_key) == tag_value
 
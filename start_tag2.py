@@ -1,5 +1,4 @@
 import os
-import boto3
 import logging
 import json
 import sys
@@ -8,17 +7,22 @@ import traceback
 from dotenv import load_dotenv
 from colorama import Fore, Style
 
+from clients import get_client
+from inventory import ClusterTagIndex, describe_services_inventory
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client("ecs")
+ecs_client = get_client('ecs')
+cluster_tag_index = ClusterTagIndex(ecs_client)
 
 def start_services_by_tags(clusters: list[dict]) -> None:
     try:
         response = ecs_client.list_clusters()
         cluster_arns = response.get('clusterArns', [])
+        cluster_tag_index.prefetch(cluster_arns)
 
         for cluster in clusters:
             tag_key = cluster.get('tag_key')
@@ -34,12 +38,12 @@ def start_services_by_tags(clusters: list[dict]) -> None:
                 logger.info(f"{Fore.CYAN}Cluster {cluster_arn} with tag value: {cluster_tags.get(tag_key)}{Style.RESET_ALL}")
 
                 services_arns = ecs_client.list_services(cluster=cluster_arn).get('serviceArns', [])
+                service_inventory = describe_services_inventory(ecs_client, cluster_arn, services_arns)
 
-                for service_arn in services_arns:
-                    service_name = service_arn.split('/')[-1]
-                    service_tags = get_service_tags(service_arn)
+                for service in service_inventory.values():
+                    service_name = service['name']
 
-                    for service_tag_value in service_tags.values():
+                    for service_tag_value in service['tags'].values():
                         if service_tag_value is not None:
                             desired_count = services.get(service_tag_value, 0)
 
@@ -75,12 +79,7 @@ def cluster_has_all_tags(cluster_arn: str, tag_key: str, tag_value: str) -> bool
         return False
 
 def get_cluster_tags(cluster_arn: str) -> dict:
-    response = ecs_client.list_tags_for_resource(resourceArn=cluster_arn)
-    return {tag['key']: tag['value'] for tag in response.get('tags', {})}
-
-def get_service_tags(service_arn: str) -> dict:
-    response = ecs_client.list_tags_for_resource(resourceArn=service_arn)
-    return {tag['key']: tag['value'] for tag in response.get('tags', {})}
+    return cluster_tag_index.get(cluster_arn)
 
 def handle_exit(signum, frame):
     logger.info("Received signal to exit. Exiting gracefully.")
@@ -1,111 +1,296 @@
 import os
-import boto3
 import logging
 import json
 import sys
 import signal
+import argparse
+import atexit
 import traceback
-import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from colorama import Fore, Style
 
+from clients import get_client
+from discovery import EcsDiscovery, create_discovery
+from executor import MAX_CLUSTER_WORKERS, MAX_WORKERS, converge_updates, request_stop, retry_failed_updates, update_services
+from instrumentation import ApiMetrics
+from inventory_cache import DEFAULT_CACHE_TTL
+from journal import RunJournal
+from matching import ServiceCountIndex
+from plan import load_plan, write_dead_letter, write_plan
+from profiling import PhaseProfiler, timed_phase
+from rate_limiter import AdaptiveRateLimiter
+from selection import index_start_clusters, resolve_start_updates
+from snapshot import DesiredCountSnapshot
+from waiter import DEFAULT_WAIT_TIMEOUT, wait_for_steady_state
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client("ecs")
+ecs_client = get_client('ecs')
+update_client = get_client('ecs', caller_throttled=True)  # botocore leaves its throttles to rate_limiter
+service_discovery = EcsDiscovery(ecs_client)  # Replaced by the --discovery backend when run as a script
+
+RATE_LIMIT = float(os.getenv('RATE_LIMIT', 20))  # Starting calls per second for ECS UpdateService API
+MAX_RATE_LIMIT = float(os.getenv('MAX_RATE_LIMIT', 50))  # Ceiling the adaptive rate ramps up to
+rate_limiter = AdaptiveRateLimiter(RATE_LIMIT, max_rate=MAX_RATE_LIMIT)  # Shared by every update_service worker
+run_journal: RunJournal | None = None  # Set by --journal when run as a script
+run_profiler: PhaseProfiler | None = None  # Set by --profile when run as a script
+dead_letter_path = os.getenv('DEAD_LETTER_PATH', 'start_tag3.dead_letter.json')  # Overridden by --dead-letter when run as a script
+cluster_errors: list[dict] = []  # Clusters whose discovery or updates failed in the last run, with the error
 
-RATE_LIMIT = 20  # Maximum number of calls per second for ECS UpdateService API
-SLEEP_TIME = 1 / RATE_LIMIT  # Sleep time between API calls
+def start_services_by_tags(clusters: list[dict], converge: bool = False, max_clusters: int = MAX_CLUSTER_WORKERS, wait: bool = False, wait_timeout: float = DEFAULT_WAIT_TIMEOUT, raise_errors: bool = False) -> list[dict]:
+    """
+    Start the services of every cluster matching a CLUSTERS entry.
+
+    Errors are logged and an empty result is returned, unless `raise_errors` is set (as
+    fanout does), in which case they are logged and re-raised. A failure confined to one
+    cluster does not end the run; it is logged and added to `cluster_errors`.
+    """
+    cluster_errors.clear()
 
-def start_services_by_tags(clusters: list[dict]) -> None:
     try:
-        response = ecs_client.list_clusters()
-        cluster_arns = response.get('clusterArns', [])
+        cluster_indexes = get_cluster_indexes(clusters)
+
+        with ThreadPoolExecutor(max_workers=max_clusters) as pool:
+            cluster_outcomes = list(pool.map(lambda item: start_all_services_in_cluster(item[0], item[1], converge), cluster_indexes.items()))
 
-        for cluster in clusters:
-            tag_key = cluster.get('tag_key')
-            tag_value = cluster.get('tag_value')
-            services = cluster.get('services', {})
+        if converge:
+            total_calls_saved = sum(calls_saved for _, calls_saved in cluster_outcomes)
+            logger.info(f"{Fore.CYAN}Converge mode saved {total_calls_saved} update_service calls in total.{Style.RESET_ALL}")
 
-            filtered_clusters = [c_arn for c_arn in cluster_arns if cluster_has_all_tags(c_arn, tag_key, tag_value)]
+        results = [result for cluster_results, _ in cluster_outcomes for result in cluster_results]
+        results = retry_failed_services(results)
 
-            for cluster_arn in filtered_clusters:
-                start_all_services_in_cluster(cluster_arn, services)
+        if wait:
+            wait_for_steady_state(ecs_client, results, wait_timeout, max_clusters)
+
+        return results
 
     except ecs_client.exceptions.ClientError as e:
         error_message = e.response.get('Error', {}).get('Message')
         logger.error(f"Error starting services. Message: {error_message}")
         traceback.print_exc()
+        if raise_errors:
+            raise
+        return []
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
         traceback.print_exc()
+        if raise_errors:
+            raise
+        return []
+
+def get_cluster_indexes(clusters: list[dict]) -> dict[str, ServiceCountIndex]:
+    cluster_arns = service_discovery.list_cluster_arns()
+
+    with timed_phase(run_profiler, 'cluster_tag_filter'):
+        return index_start_clusters(service_discovery, cluster_arns, clusters)
 
-def start_all_services_in_cluster(cluster_arn: str, services: dict) -> None:
+def start_all_services_in_cluster(cluster_arn: str, service_counts: ServiceCountIndex, converge: bool = False) -> tuple[list[dict], int]:
     try:
-        logger.info(f"Checking services in cluster {cluster_arn}")
+        updates = get_cluster_updates(cluster_arn, service_counts)
 
-        services_paginator = ecs_client.get_paginator('list_services')
-        services_iterator = services_paginator.paginate(cluster=cluster_arn)
+        calls_saved = 0
+        if converge:
+            updates, calls_saved = converge_updates(updates)
+            logger.info(f"{Fore.CYAN}Converge mode skipped {calls_saved} update_service calls in cluster {cluster_arn}.{Style.RESET_ALL}")
 
-        for services_page in services_iterator:
-            services_arns = services_page.get('serviceArns', [])
+        results = update_services(update_client, updates, rate_limiter, MAX_WORKERS, run_journal)
+        service_discovery.record_results(results)
 
-            for service_arn in services_arns:
-                service_name = service_arn.split('/')[-1]
-                service_tags = get_service_tags(service_arn)
-                
-                for service_tag_value in service_tags.values():
-                    if service_tag_value is not None:
-                        desired_count = services.get(service_tag_value, 1)
+        logger.info(f"{Fore.GREEN}Services started successfully in cluster {cluster_arn}.{Style.RESET_ALL}")
+        return results, calls_saved
 
-                        ecs_client.update_service(
-                            cluster=cluster_arn,
-                            service=service_name,
-                            desiredCount=desired_count,
-                        )
+    except ecs_client.exceptions.ClientError as e:
+        error_message = e.response.get('Error', {}).get('Message')
+        logger.error(f"Error discovering services in cluster {cluster_arn}. Message: {error_message}")
+        traceback.print_exc()
+        cluster_errors.append({'cluster': cluster_arn, 'error': error_message})
+        return [], 0
+    except Exception as e:
+        # For example a connection or read timeout; the other clusters still get their retries and waits.
+        logger.error(f"Unexpected error in cluster {cluster_arn}: {e}")
+        traceback.print_exc()
+        cluster_errors.append({'cluster': cluster_arn, 'error': str(e)})
+        return [], 0
 
-                        logger.info(f"{Fore.GREEN}Service {service_name} in cluster {cluster_arn} started (desired count set to {desired_count}).{Style.RESET_ALL}")
-                    else:
-                        logger.warning(f"{Fore.RED}Tag value not found for service {service_name} in cluster {cluster_arn}. Skipping service.{Style.RESET_ALL}")
+def get_cluster_updates(cluster_arn: str, service_counts: ServiceCountIndex) -> list[dict]:
+    logger.info(f"Checking services in cluster {cluster_arn}")
 
-                time.sleep(SLEEP_TIME)
+    return resolve_start_updates(cluster_arn, service_discovery.describe_services(cluster_arn), service_counts)
 
-        logger.info(f"{Fore.GREEN}Services started successfully in cluster {cluster_arn}.{Style.RESET_ALL}")
+def plan_services_by_tags(clusters: list[dict], plan_path: str, max_clusters: int = MAX_CLUSTER_WORKERS) -> None:
+    try:
+        cluster_indexes = get_cluster_indexes(clusters)
+
+        with ThreadPoolExecutor(max_workers=max_clusters) as pool:
+            cluster_updates = list(pool.map(lambda item: get_cluster_updates(item[0], item[1]), cluster_indexes.items()))
+
+        updates = [update for updates in cluster_updates for update in updates]
+        write_plan(plan_path, 'start', ecs_client.meta.region_name, updates)
+
+        logger.info(f"{Fore.CYAN}Wrote a plan for {len(updates)} services in {len(cluster_updates)} clusters to {plan_path}.{Style.RESET_ALL}")
+
+    except ecs_client.exceptions.ClientError as e:
+        error_message = e.response.get('Error', {}).get('Message')
+        logger.error(f"Error planning services. Message: {error_message}")
+        traceback.print_exc()
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        traceback.print_exc()
+
+def apply_plan(plan_path: str, converge: bool = False, max_clusters: int = MAX_CLUSTER_WORKERS, wait: bool = False, wait_timeout: float = DEFAULT_WAIT_TIMEOUT) -> None:
+    try:
+        plan = load_plan(plan_path)
+
+        if plan['region'] != ecs_client.meta.region_name:
+            logger.error(f"Plan {plan_path} was made in region {plan['region']}, not {ecs_client.meta.region_name}. Exiting.")
+            return
+
+        updates = plan['updates']
+
+        if converge:
+            # current_count is the count seen when the plan was made.
+            updates, calls_saved = converge_updates(updates)
+            logger.info(f"{Fore.CYAN}Converge mode skipped {calls_saved} update_service calls.{Style.RESET_ALL}")
+
+        logger.info(f"Applying {plan['action']} plan {plan_path} to {len(updates)} services")
+        apply_updates(updates, max_clusters, wait, wait_timeout)
 
     except ecs_client.exceptions.ClientError as e:
         error_message = e.response.get('Error', {}).get('Message')
-        logger.error(f"Error updating services. Message: {error_message}")
+        logger.error(f"Error applying plan. Message: {error_message}")
+        traceback.print_exc()
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
         traceback.print_exc()
 
-def cluster_has_all_tags(cluster_arn: str, tag_key: str, tag_value: str) -> bool:
+def restore_services_from_snapshot(snapshot_path: str, max_clusters: int = MAX_CLUSTER_WORKERS, wait: bool = False, wait_timeout: float = DEFAULT_WAIT_TIMEOUT) -> None:
     try:
-        cluster_tags = get_cluster_tags(cluster_arn)
-        return cluster_tags.get(tag_key) == tag_value
+        if not os.path.exists(snapshot_path):
+            logger.error(f"Snapshot {snapshot_path} not found. Exiting.")
+            return
+
+        snapshot = DesiredCountSnapshot(snapshot_path)
+        updates = snapshot.to_updates()
+
+        if not updates:
+            logger.info("No services found in the snapshot. Exiting.")
+            return
+
+        logger.info(f"Restoring desired counts of {len(updates)} services from snapshot {snapshot_path}")
+        results = apply_updates(updates, max_clusters, wait, wait_timeout)
+
+        # Restored services leave the snapshot, so a service parked at 0 later is not brought back by the next cycle.
+        discarded = snapshot.discard(results)
+        snapshot.save()
+        logger.info(f"Removed {discarded} restored services from snapshot {snapshot_path}; {len(updates) - discarded} remain.")
 
     except ecs_client.exceptions.ClientError as e:
         error_message = e.response.get('Error', {}).get('Message')
-        logger.error(f"Error checking tags for cluster {cluster_arn}. Message: {error_message}")
+        logger.error(f"Error restoring services. Message: {error_message}")
+        traceback.print_exc()
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
         traceback.print_exc()
-        return False
 
-def get_cluster_tags(cluster_arn: str) -> dict:
-    response = ecs_client.list_tags_for_resource(resourceArn=cluster_arn)
-    return {tag['key']: tag['value'] for tag in response.get('tags', {})}
+def apply_updates(updates: list[dict], max_clusters: int = MAX_CLUSTER_WORKERS, wait: bool = False, wait_timeout: float = DEFAULT_WAIT_TIMEOUT) -> list[dict]:
+    results = update_services(update_client, updates, rate_limiter, MAX_WORKERS, run_journal)
+    service_discovery.record_results(results)
+    results = retry_failed_services(results)
 
-def get_service_tags(service_arn: str) -> dict:
-    response = ecs_client.list_tags_for_resource(resourceArn=service_arn)
-    return {tag['key']: tag['value'] for tag in response.get('tags', {})}
+    logger.info(f"{Fore.GREEN}Services updated successfully.{Style.RESET_ALL}")
+
+    if wait:
+        wait_for_steady_state(ecs_client, results, wait_timeout, max_clusters)
+
+    return results
+
+def retry_failed_services(results: list[dict]) -> list[dict]:
+    results = retry_failed_updates(update_client, results, rate_limiter, MAX_WORKERS, run_journal)
+    service_discovery.record_results([result for result in results if 'retry_attempts' in result])
+
+    failed_count = write_dead_letter(dead_letter_path, 'start', ecs_client.meta.region_name, results)
+    if failed_count:
+        logger.error(f"{Fore.RED}{failed_count} services still failed after retries. Wrote them to {dead_letter_path}; rerun them with --apply {dead_letter_path}.{Style.RESET_ALL}")
+
+    return results
 
 def handle_exit(signum, frame):
     logger.info("Received signal to exit. Exiting gracefully.")
+    request_stop()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, handle_exit)
 
+def parse_command_line_args():
+    parser = argparse.ArgumentParser(description='Start ECS services in clusters matching the CLUSTERS tags.')
+    parser.add_argument('--converge', action='store_true', help='Only update services whose desired count differs from the target')
+    parser.add_argument('--dead-letter', default=dead_letter_path, help='Write updates that still fail after retries to this plan file, for --apply')
+    parser.add_argument('--discovery', choices=['ecs', 'tagging'], default='ecs', help='Discover services by walking the ECS API or with the Resource Groups Tagging API')
+    parser.add_argument('--cache', action='store_true', help='Reuse the on-disk inventory of clusters, services and tags')
+    parser.add_argument('--cache-ttl', type=float, default=float(os.getenv('INVENTORY_CACHE_TTL', DEFAULT_CACHE_TTL)), help='Seconds before cached inventory is rediscovered')
+    parser.add_argument('--metrics-json', help='Write per-operation API metrics to this JSON file at exit')
+    parser.add_argument('--metrics-prom', help='Write per-operation API metrics to this Prometheus textfile at exit')
+    parser.add_argument('--journal', help='Append every planned and completed service update to this crash-safe journal')
+    parser.add_argument('--max-clusters', type=int, default=MAX_CLUSTER_WORKERS, help='Number of clusters processed at the same time')
+    parser.add_argument('--refresh', action='store_true', help='Rediscover the inventory and overwrite the cache')
+    parser.add_argument('--profile', action='store_true', help='Time every phase of the run and print a summary table at exit')
+    parser.add_argument('--profile-output', default='start_tag3.profile.json', help='JSON file the --profile timings are written to')
+    parser.add_argument('--pstats', help='With --profile, also write a cProfile dump of all threads to this file')
+    parser.add_argument('--plan', help='Resolve CLUSTERS against the inventory and write the updates to this JSON file instead of applying them')
+    parser.add_argument('--apply', help='Apply the updates in a plan file written by --plan, without any discovery')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run, skipping the updates the --journal file marks as completed')
+    parser.add_argument('--restore', help='Restore the desired counts saved by stop_tag3.py --snapshot, without any discovery')
+    parser.add_argument('--wait', action='store_true', help='Wait until every updated service has runningCount == desiredCount')
+    parser.add_argument('--wait-timeout', type=float, default=DEFAULT_WAIT_TIMEOUT, help='Seconds to wait for services to reach a steady state')
+
+    args = parser.parse_args()
+    if args.pstats and not args.profile:
+        parser.error('--pstats needs --profile')
+    if args.resume and not args.journal:
+        parser.error('--resume needs the --journal of the interrupted run')
+    if sum(bool(mode) for mode in (args.plan, args.apply, args.restore)) > 1:
+        parser.error('--plan, --apply and --restore cannot be combined')
+
+    return args
+
 if __name__ == "__main__":
+    args = parse_command_line_args()
+    service_discovery = create_discovery(args.discovery, ecs_client, args.cache, args.cache_ttl, args.refresh, live_counts=args.converge or bool(args.plan))
+
+    dead_letter_path = args.dead_letter
+
+    if args.journal:
+        run_journal = RunJournal(args.journal, resume=args.resume)
+        atexit.register(run_journal.close)
+
+    if args.profile:
+        run_profiler = PhaseProfiler('start_tag3')
+        run_profiler.attach(ecs_client)
+        run_profiler.attach(update_client)
+        run_profiler.track_sleep(rate_limiter)
+        run_profiler.start(capture_pstats=bool(args.pstats))
+        atexit.register(run_profiler.finish, args.profile_output, args.pstats)
+
+    if args.metrics_json or args.metrics_prom:
+        api_metrics = ApiMetrics('start_tag3')
+        api_metrics.attach(ecs_client)
+        api_metrics.attach(update_client)
+        api_metrics.track_sleep(rate_limiter)
+        atexit.register(api_metrics.write, args.metrics_json, args.metrics_prom)
+
     clusters_json = os.getenv('CLUSTERS', '[]')
     clusters = json.loads(clusters_json)
 
-    start_services_by_tags(clusters)
+    if args.restore:
+        restore_services_from_snapshot(args.restore, max_clusters=args.max_clusters, wait=args.wait, wait_timeout=args.wait_timeout)
+    elif args.apply:
+        apply_plan(args.apply, converge=args.converge, max_clusters=args.max_clusters, wait=args.wait, wait_timeout=args.wait_timeout)
+    elif args.plan:
+        plan_services_by_tags(clusters, args.plan, max_clusters=args.max_clusters)
+    else:
+        start_services_by_tags(clusters, converge=args.converge, max_clusters=args.max_clusters, wait=args.wait, wait_timeout=args.wait_timeout)
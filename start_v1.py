@@ -1,4 +1,3 @@
-import boto3
 import os
 import json
 import logging
@@ -8,12 +7,14 @@ import time
 import traceback
 from dotenv import load_dotenv
 
+from clients import get_client
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client("ecs")
+ecs_client = get_client('ecs')
 
 def update_services(cluster_name: str, service_counts: dict[str, int]) -> None:
     for service_name, desired_count in service_counts.items():
@@ -1,4 +1,3 @@
-import boto3
 import os
 import argparse
 import logging
@@ -7,12 +6,20 @@ import time
 from dotenv import load_dotenv
 from typing import Dict, List
 
+from clients import get_client
+from executor import stop_targeted_services
+from rate_limiter import TokenBucket
+
 load_dotenv() 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client('ecs')
+ecs_client = get_client('ecs')
+update_client = get_client('ecs', caller_throttled=True)  # For the -c/-s fast path, whose rate limiter retries throttles
+
+RATE_LIMIT = float(os.getenv('RATE_LIMIT', 20))  # Maximum calls per second for ECS UpdateService API
+rate_limiter = TokenBucket(RATE_LIMIT)
 
 def stop_all_services(clusters_services: Dict[str, List[str]]) -> None:
     """
@@ -63,10 +70,9 @@ if __name__ == "__main__":
         clusters_services[cluster_name] = service_list
         i += 1
 
-    if clusters_services and not (args.cluster and args.services):
-        stop_all_services(clusters_services)
-    elif args.cluster and args.services:
-        clusters_services = {args.cluster: args.services}
+    if args.cluster and args.services:
+        stop_targeted_services(ecs_client, update_client, args.cluster, args.services, rate_limiter)
+    elif clusters_services:
         stop_all_services(clusters_services)
     else:
         print("No valid input provided. Please specify cluster and services.")
@@ -1,6 +1,5 @@
 import os
 import json
-import boto3
 import sys
 import logging
 import signal
@@ -8,17 +7,22 @@ import traceback
 from dotenv import load_dotenv
 from colorama import Fore, Style
 
+from clients import get_client
+from inventory import ClusterTagIndex
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client("ecs")
+ecs_client = get_client('ecs')
+cluster_tag_index = ClusterTagIndex(ecs_client)
 
 def stop_services_by_tags(tags: list[dict]) -> None:
     try:
         response = ecs_client.list_clusters()
         cluster_arns = response.get('clusterArns', [])
+        cluster_tag_index.prefetch(cluster_arns)
 
         filtered_clusters = [
             cluster_arn for cluster_arn in cluster_arns
@@ -50,8 +54,7 @@ def stop_services_by_tags(tags: list[dict]) -> None:
 
 def cluster_has_any_tags(cluster_arn: str, tags: list[dict]) -> bool:
     try:
-        response = ecs_client.list_tags_for_resource(resourceArn=cluster_arn)
-        cluster_tags = {tag['key']: tag['value'] for tag in response.get('tags', {})}
+        cluster_tags = cluster_tag_index.get(cluster_arn)
 
         return any(cluster_tags.get(tag['key']) == tag['value'] for tag in tags)
 
@@ -1,24 +1,35 @@
 import os
 import json
-import boto3
 import logging
 import sys
 import signal
 import traceback
+from collections.abc import Iterator
 from dotenv import load_dotenv
 from colorama import Fore, Style
 
+from clients import get_client
+from executor import MAX_WORKERS, request_stop, stream_updates
+from inventory import ClusterTagIndex
+from rate_limiter import TokenBucket
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client("ecs")
+ecs_client = get_client('ecs')
+update_client = get_client('ecs', caller_throttled=True)  # botocore leaves its throttles to rate_limiter
+cluster_tag_index = ClusterTagIndex(ecs_client)
+
+RATE_LIMIT = float(os.getenv('RATE_LIMIT', 20))  # Maximum calls per second for ECS UpdateService API
+rate_limiter = TokenBucket(RATE_LIMIT)  # Shared by every update_service worker
 
 def stop_services_by_tags(tags: list[dict]) -> None:
     try:
         response = ecs_client.list_clusters()
         cluster_arns = response.get('clusterArns', [])
+        cluster_tag_index.prefetch(cluster_arns)
 
         filtered_clusters = [
             cluster_arn for cluster_arn in cluster_arns
@@ -31,16 +42,19 @@ def stop_services_by_tags(tags: list[dict]) -> None:
 
         logger.info(f"Clusters to process: {filtered_clusters}")
 
-        services_to_stop = []
-        for cluster_arn in filtered_clusters:
-            services_arns = ecs_client.list_services(cluster=cluster_arn).get('serviceArns', [])
-            services_to_stop.extend(services_arns)
+        # Services are stopped as soon as their list_services page arrives, while later clusters are still being listed.
+        updates = (
+            {'cluster': cluster_arn, 'service': service_arn.split('/')[-1], 'desired_count': 0}
+            for cluster_arn, service_arn in filter_new_services(iter_service_arns(filtered_clusters))
+        )
+        results = stream_updates(update_client, updates, rate_limiter, MAX_WORKERS)
 
-        if not services_to_stop:
+        if not results:
             logger.info("No services found in the clusters. Exiting.")
             return
 
-        update_services_batch(filtered_clusters, services_to_stop, desired_count=0)
+        stopped_count = sum(1 for result in results if result['status'] == 'updated')
+        logger.info(f"{Fore.RED}Stopped {stopped_count} of {len(results)} services in {len(filtered_clusters)} clusters.{Style.RESET_ALL}")
 
     except ecs_client.exceptions.ClientError as e:
         error_message = e.response.get('Error', {}).get('Message')
@@ -50,41 +64,29 @@ def stop_services_by_tags(tags: list[dict]) -> None:
         logger.error(f"Unexpected error: {e}")
         traceback.print_exc()
 
-def update_services_batch(clusters: list, services: list, desired_count: int) -> None:
-    try:
-        logger.info(f"Stopping {len(services)} services in {len(clusters)} clusters.")
-
-        for cluster_arn in clusters:
-            logger.info(f"Processing cluster: {cluster_arn}")
-            services_arns = ecs_client.list_services(cluster=cluster_arn).get('serviceArns', [])
-
-            for service_arn in services_arns:
-                service_name = service_arn.split('/')[-1]
-                
-                if service_arn in services:  
-                    try:
-                        ecs_client.update_service(
-                            cluster=cluster_arn,
-                            service=service_name,
-                            desiredCount=desired_count,
-                        )
-                        logger.info(f"{Fore.RED}Service {service_name} in cluster {cluster_arn} stopped (desired count set to {desired_count}).{Style.RESET_ALL}")
-                    except ecs_client.exceptions.ServiceNotFoundException:
-                        logger.warning(f"{Fore.YELLOW}Service {service_name} not found in cluster {cluster_arn}. Skipping service.{Style.RESET_ALL}")
-                else:
-                    logger.info(f"Service {service_name} in cluster {cluster_arn} is not in the list of services to be stopped. Skipping.")
-
-        logger.info(f"{Fore.RED}Services stopped successfully.{Style.RESET_ALL}")
+def iter_service_arns(cluster_arns: list[str]) -> Iterator[tuple[str, str]]:
+    services_paginator = ecs_client.get_paginator('list_services')
 
-    except ecs_client.exceptions.ClientError as e:
-        error_message = e.response.get('Error', {}).get('Message')
-        logger.error(f"Error updating services. Message: {error_message}")
-        traceback.print_exc()
+    for cluster_arn in cluster_arns:
+        logger.info(f"Processing cluster: {cluster_arn}")
+
+        for services_page in services_paginator.paginate(cluster=cluster_arn):
+            for service_arn in services_page.get('serviceArns', []):
+                yield cluster_arn, service_arn
+
+def filter_new_services(services: Iterator[tuple[str, str]]) -> Iterator[tuple[str, str]]:
+    seen_service_arns = set()
+
+    for cluster_arn, service_arn in services:
+        if service_arn in seen_service_arns:
+            continue
+
+        seen_service_arns.add(service_arn)
+        yield cluster_arn, service_arn
 
 def cluster_has_any_tags(cluster_arn: str, tags: list[dict]) -> bool:
     try:
-        response = ecs_client.list_tags_for_resource(resourceArn=cluster_arn)
-        cluster_tags = {tag['key']: tag['value'] for tag in response.get('tags', {})}
+        cluster_tags = cluster_tag_index.get(cluster_arn)
 
         return any(cluster_tags.get(tag['key']) == tag['value'] for tag in tags)
 
@@ -96,6 +98,7 @@ def cluster_has_any_tags(cluster_arn: str, tags: list[dict]) -> bool:
 
 def handle_exit(signum, frame):
     logger.info("Received signal to exit. Exiting gracefully.")
+    request_stop()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, handle_exit)
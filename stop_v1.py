@@ -1,4 +1,3 @@
-import boto3
 import os
 import json
 import logging
@@ -9,12 +8,20 @@ import argparse
 import traceback
 from dotenv import load_dotenv
 
+from clients import get_client
+from executor import request_stop, stop_targeted_services
+from rate_limiter import TokenBucket
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-ecs_client = boto3.client("ecs")
+ecs_client = get_client('ecs')
+update_client = get_client('ecs', caller_throttled=True)  # For the -c/-s fast path, whose rate limiter retries throttles
+
+RATE_LIMIT = float(os.getenv('RATE_LIMIT', 20))  # Maximum calls per second for ECS UpdateService API
+rate_limiter = TokenBucket(RATE_LIMIT)
 
 def update_services(cluster_name:str, service_counts: list[str]) -> None:
     for service_name, desired_count in service_counts.items():
@@ -38,6 +45,7 @@ def update_services(cluster_name:str, service_counts: list[str]) -> None:
 
 def handle_exit(signum, frame):
     logger.info("Received signal to exit. Exiting gracefully.")
+    request_stop()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, handle_exit)
@@ -54,13 +62,12 @@ if __name__ == '__main__':
 
     clusters = json.loads(os.getenv("CLUSTERS", "[]"))
 
-    for cluster in clusters:
-        service_counts = cluster["services"]
-        if clusters and not (args.cluster and args.services):
-            update_services(cluster["name"], service_counts)
-        elif args.cluster and args.services:
-            update_services(cluster["name"], service_counts)
-        else:
-            print("No valid input provided. Please specify cluster and services.")
+    if args.cluster and args.services:
+        stop_targeted_services(ecs_client, update_client, args.cluster, args.services, rate_limiter)
+    elif clusters:
+        for cluster in clusters:
+            update_services(cluster["name"], cluster["services"])
+    else:
+        print("No valid input provided. Please specify cluster and services.")
 
     print("\n Operation finished")
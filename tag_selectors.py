@@ -0,0 +1,179 @@
+import re
+from functools import lru_cache
+
+# A bare word is anything AWS allows in a tag key or value except spaces and "=";
+# quote keys or values that contain those.
+TOKEN_PATTERN = re.compile(r'''\s*(?:(?P<op>!=|=|\(|\))|"(?P<dquoted>[^"]*)"|'(?P<squoted>[^']*)'|(?P<word>[\w.:/+@-]+))''')
+KEYWORDS = {'AND', 'OR', 'NOT'}
+
+
+class TagSelector:
+    """
+    Compiled boolean expression over a resource's tags.
+
+    Grammar, loosest binding first:
+    - a OR b
+    - a AND b
+    - NOT a
+    - Key=Value, Key!=Value, Key (the tag exists) or a parenthesised expression.
+
+    `Team!=payments` also matches resources without a Team tag. Keywords are upper case;
+    quote a key or value that is one of them or contains spaces or "=".
+
+    Example: `Env=dev AND NOT (Team=payments OR Critical)`
+
+    Parameters:
+    - expression (str): Source of the selector, kept for logging.
+    - predicate: Function from a tag dict to bool.
+    """
+
+    def __init__(self, expression: str, predicate) -> None:
+        self.expression = expression
+        self._predicate = predicate
+
+    def matches(self, tags: dict) -> bool:
+        return self._predicate(tags)
+
+    def __repr__(self) -> str:
+        return f"TagSelector({self.expression!r})"
+
+
+@lru_cache(maxsize=None)
+def compile_selector(expression: str) -> TagSelector:
+    """
+    Parse a selector expression once; later calls with the same expression reuse the result.
+
+    Raises:
+    - ValueError: The expression is not valid.
+    """
+    parser = _SelectorParser(expression)
+    predicate = parser.parse_or()
+
+    if parser.peek() is not None:
+        raise ValueError(f"Unexpected {parser.peek()[1]!r} in tag selector {expression!r}")
+
+    return TagSelector(expression, predicate)
+
+def entry_selector(entry: dict, key_field: str = 'key', value_field: str = 'value') -> TagSelector:
+    """
+    Selector for a STOP_TAGS or CLUSTERS entry: its `selector` expression, or otherwise the
+    original single key/value pair (`key`/`value` or `tag_key`/`tag_value`).
+
+    Raises:
+    - ValueError: The entry has neither a non-empty `selector` nor both key/value fields, so
+      it would otherwise match every cluster.
+    """
+    if entry.get('selector'):
+        return compile_selector(entry['selector'])
+
+    tag_key = entry.get(key_field)
+    tag_value = entry.get(value_field)
+
+    if not tag_key or tag_value is None:
+        raise ValueError(f"Entry {entry!r} needs a non-empty 'selector' or both '{key_field}' and '{value_field}'")
+
+    return TagSelector(f"{tag_key}={tag_value}", lambda tags: tags.get(tag_key) == tag_value)
+
+def service_selector(entry: dict) -> TagSelector | None:
+    if entry.get('service_selector'):
+        return compile_selector(entry['service_selector'])
+
+    return None
+
+
+class _SelectorParser:
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        self.tokens = self._tokenize(expression)
+        self.position = 0
+
+    def peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self._accept('keyword', 'OR'):
+            operands.append(self.parse_and())
+
+        if len(operands) == 1:
+            return operands[0]
+        return lambda tags: any(operand(tags) for operand in operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self._accept('keyword', 'AND'):
+            operands.append(self.parse_not())
+
+        if len(operands) == 1:
+            return operands[0]
+        return lambda tags: all(operand(tags) for operand in operands)
+
+    def parse_not(self):
+        if self._accept('keyword', 'NOT'):
+            operand = self.parse_not()
+            return lambda tags: not operand(tags)
+
+        return self.parse_atom()
+
+    def parse_atom(self):
+        if self._accept('op', '('):
+            inner = self.parse_or()
+            self._expect('op', ')')
+            return inner
+
+        tag_key = self._expect_value()
+
+        if self._accept('op', '='):
+            tag_value = self._expect_value()
+            return lambda tags: tags.get(tag_key) == tag_value
+
+        if self._accept('op', '!='):
+            tag_value = self._expect_value()
+            return lambda tags: tags.get(tag_key) != tag_value
+
+        return lambda tags: tag_key in tags
+
+    def _accept(self, kind: str, text: str) -> bool:
+        if self.peek() == (kind, text):
+            self.position += 1
+            return True
+        return False
+
+    def _expect(self, kind: str, text: str) -> None:
+        if not self._accept(kind, text):
+            raise ValueError(f"Expected {text!r} in tag selector {self.expression!r}")
+
+    def _expect_value(self) -> str:
+        token = self.peek()
+
+        if token is None or token[0] != 'value':
+            found = 'end of input' if token is None else repr(token[1])
+            raise ValueError(f"Expected a tag key or value but found {found} in tag selector {self.expression!r}")
+
+        self.position += 1
+        return token[1]
+
+    @staticmethod
+    def _tokenize(expression: str) -> list[tuple[str, str]]:
+        tokens = []
+        position = 0
+
+        while expression[position:].strip():
+            match = TOKEN_PATTERN.match(expression, position)
+
+            if match is None:
+                raise ValueError(f"Invalid character {expression[position:].lstrip()[0]!r} in tag selector {expression!r}")
+
+            if match.group('op'):
+                tokens.append(('op', match.group('op')))
+            elif match.group('word') in KEYWORDS:
+                tokens.append(('keyword', match.group('word')))
+            elif match.group('word') is not None:
+                tokens.append(('value', match.group('word')))
+            else:
+                quoted = match.group('dquoted') if match.group('dquoted') is not None else match.group('squoted')
+                tokens.append(('value', quoted))
+
+            position = match.end()
+
+        return tokens
@@ -0,0 +1,100 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from colorama import Fore, Style
+
+from executor import MAX_CLUSTER_WORKERS
+from inventory import DESCRIBE_SERVICES_BATCH_SIZE, chunked
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WAIT_TIMEOUT = 600  # Seconds to wait for services to reach a steady state
+MIN_POLL_INTERVAL = 2  # Seconds between polls right after progress was made
+MAX_POLL_INTERVAL = 15  # Seconds between polls once a cluster stops making progress
+POLL_BACKOFF = 1.5  # Interval multiplier applied after a poll without progress
+
+
+def wait_for_steady_state(ecs_client, results: list[dict], timeout: float = DEFAULT_WAIT_TIMEOUT, max_clusters: int = MAX_CLUSTER_WORKERS) -> list[dict]:
+    """
+    Poll updated services until runningCount == desiredCount, or the timeout is hit.
+
+    Each cluster is polled on its own worker with describe_services batches of 10. The poll
+    interval grows while a cluster makes no progress and resets once a service becomes ready.
+    If polling a cluster fails, its pending services are reported as not ready with an `error`
+    key and the other clusters keep being polled, so the wait never raises after the updates.
+
+    Parameters:
+    - ecs_client: boto3 ECS client.
+    - results (list[dict]): Executor results; only those with status "updated" are waited on.
+    - timeout (float): Seconds before giving up on services that are not ready.
+    - max_clusters (int): Number of clusters polled at the same time.
+
+    Returns:
+    - list[dict]: One report row per service with `ready` and `time_to_ready` keys.
+    """
+    services_by_cluster = {}
+    for result in results:
+        if result['status'] == 'updated':
+            services_by_cluster.setdefault(result['cluster'], {})[result['service']] = result
+
+    if not services_by_cluster:
+        return []
+
+    deadline = time.monotonic() + timeout
+    logger.info(f"Waiting up to {timeout:.0f}s for {sum(map(len, services_by_cluster.values()))} services to reach a steady state")
+
+    with ThreadPoolExecutor(max_workers=max_clusters) as pool:
+        futures = [
+            pool.submit(_wait_for_cluster, ecs_client, cluster_arn, services, deadline)
+            for cluster_arn, services in services_by_cluster.items()
+        ]
+        report = [row for future in futures for row in future.result()]
+
+    log_readiness_report(report)
+    return report
+
+def _wait_for_cluster(ecs_client, cluster_arn: str, services: dict[str, dict], deadline: float) -> list[dict]:
+    pending = dict(services)
+    report = []
+    interval = MIN_POLL_INTERVAL
+
+    while pending:
+        ready_now = []
+
+        try:
+            for batch in chunked(list(pending), DESCRIBE_SERVICES_BATCH_SIZE):
+                response = ecs_client.describe_services(cluster=cluster_arn, services=batch)
+
+                for service in response.get('services', []):
+                    if service['runningCount'] == service['desiredCount']:
+                        ready_now.append(service['serviceName'])
+        except Exception as e:
+            # The updates are already applied; a failed poll only ends the wait for this cluster.
+            logger.error(f"Error polling services in cluster {cluster_arn}: {e}")
+            report.extend({**result, 'ready': False, 'time_to_ready': None, 'error': str(e)} for result in pending.values())
+            return report
+
+        for service_name in ready_now:
+            result = pending.pop(service_name)
+            report.append({**result, 'ready': True, 'time_to_ready': time.time() - result['updated_at']})
+
+        if not pending or time.monotonic() >= deadline:
+            break
+
+        interval = MIN_POLL_INTERVAL if ready_now else min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+
+    report.extend({**result, 'ready': False, 'time_to_ready': None} for result in pending.values())
+    return report
+
+def log_readiness_report(report: list[dict]) -> None:
+    for row in sorted(report, key=lambda row: (row['cluster'], row['service'])):
+        if row['ready']:
+            logger.info(f"{Fore.GREEN}Service {row['service']} in cluster {row['cluster']} ready after {row['time_to_ready']:.1f}s.{Style.RESET_ALL}")
+        elif 'error' in row:
+            logger.warning(f"{Fore.YELLOW}Service {row['service']} in cluster {row['cluster']} could not be polled: {row['error']}{Style.RESET_ALL}")
+        else:
+            logger.warning(f"{Fore.YELLOW}Service {row['service']} in cluster {row['cluster']} did not reach a steady state before the timeout.{Style.RESET_ALL}")
+
+    ready_count = sum(1 for row in report if row['ready'])
+    logger.info(f"{ready_count} of {len(report)} services reached a steady state.")